@@ -0,0 +1,230 @@
+"""
+Vectorized snake environment: steps N independent games at once with NumPy.
+
+Every board is stored as rows of NumPy arrays (heads, directions, body ring buffers, occupancy grids, food),
+so one call to step() advances all of them. Rules and state features are identical to game.SnakeGame, so the
+features produced here can be used with the same Q-table. Finished boards are reset automatically.
+"""
+
+import numpy as np
+from game import BLOCK_SIZE, ACTIONS
+# Column/row offset for each action
+ACTION_DX = np.array([1, -1, 0, 0], dtype=np.int32)
+ACTION_DY = np.array([0, 0, -1, 1], dtype=np.int32)
+
+# Column of each feature in the feature arrays. Same order as game.STATE_FEATURES
+MOVING = 0  # 4 columns - moving right, left, up, down
+DANGER = 4  # 4 columns - danger right, left, up, down
+FOOD = 8  # 4 columns - food right, left, up, down
+FOOD_ADJACENT = 12
+HUNGRY = 13
+NUM_FEATURES = 14
+
+# Weight of each feature column in the int encoding of a state (first feature is the most significant bit)
+FEATURE_WEIGHTS = 1 << np.arange(NUM_FEATURES - 1, -1, -1)
+
+# Try this many rounds of vectorized rejection sampling before placing food by scanning the free cells
+FOOD_SAMPLING_ROUNDS = 8
+
+# Constants of the splitmix64 generator used for the per-board random streams
+SPLITMIX_INCREMENT = np.uint64(0x9E3779B97F4A7C15)
+SPLITMIX_MULTIPLIER_1 = np.uint64(0xBF58476D1CE4E5B9)
+SPLITMIX_MULTIPLIER_2 = np.uint64(0x94D049BB133111EB)
+
+
+class BatchSnakeGame:
+
+    # hunger_limit mirrors SnakeAgent.run_episode, which ends a game once the snake goes too long without eating:
+    # after hunger_limit moves if it has not eaten yet, and after hunger_limit + 1 moves since its last meal
+    # otherwise. Set to None to let games run until a collision.
+    # Every board has its own random stream, so a board's games only depend on its seed and the actions played on
+    # it. seeds gives the seed of each board; otherwise they are all derived from seed
+    def __init__(self, num_games, w=640, h=480, hunger_limit=100, seed=None, seeds=None):
+        self.num_games = num_games
+        self.w = w
+        self.h = h
+        self.cols = w // BLOCK_SIZE
+        self.rows = h // BLOCK_SIZE
+        self.num_cells = self.cols * self.rows
+        self.hunger_limit = hunger_limit
+        if seeds is None:
+            seeds = np.random.SeedSequence(seed).generate_state(num_games, dtype=np.uint64)
+        # State of each board's splitmix64 random stream
+        self.rng_state = np.array(seeds, dtype=np.uint64)
+
+        # Ring buffer of the cells making up each snake. The tail is at body[i, tail[i]], and the following
+        # length[i] - 1 entries (wrapping around) run up to the head
+        self.capacity = self.num_cells + 1
+        self.body = np.zeros((num_games, self.capacity), dtype=np.int32)
+        self.tail = np.zeros(num_games, dtype=np.int32)
+        self.length = np.zeros(num_games, dtype=np.int32)
+        self.occupancy = np.zeros((num_games, self.num_cells), dtype=bool)
+
+        self.head_x = np.zeros(num_games, dtype=np.int32)
+        self.head_y = np.zeros(num_games, dtype=np.int32)
+        self.direction = np.zeros(num_games, dtype=np.int8)
+        # Cell index of the food, or -1 if the snake fills the whole board
+        self.food = np.zeros(num_games, dtype=np.int32)
+        self.score = np.zeros(num_games, dtype=np.int32)
+        self.turns_since_last_ate = np.zeros(num_games, dtype=np.int32)
+        self.steps = np.zeros(num_games, dtype=np.int32)
+
+        self._rows = np.arange(num_games)
+        self.reset()
+
+    # Start new games on the boards selected by mask (all boards if mask is None). Returns the features of
+    # every board
+    def reset(self, mask=None):
+        self._reset_boards(self._rows if mask is None else np.flatnonzero(mask))
+        self._features = self.get_state()
+        return self._features
+
+    def _reset_boards(self, indices):
+        # Same starting position as SnakeGame - a snake of length 3 in the middle of the board, moving right
+        head_x = int(self.w / 2) // BLOCK_SIZE
+        head_y = int(self.h / 2) // BLOCK_SIZE
+        start_cells = head_y * self.cols + np.array([head_x - 2, head_x - 1, head_x], dtype=np.int32)
+
+        self.occupancy[indices] = False
+        self.body[indices, :3] = start_cells
+        self.occupancy[indices[:, None], start_cells] = True
+        self.tail[indices] = 0
+        self.length[indices] = 3
+        self.head_x[indices] = head_x
+        self.head_y[indices] = head_y
+        self.direction[indices] = 0
+        self.score[indices] = 0
+        self.turns_since_last_ate[indices] = 0
+        self.steps[indices] = 0
+        self._place_food(indices)
+
+    # Plays one action on every board. actions is an array of action ints (indices into game.ACTIONS).
+    # Returns (features, rewards, dones, scores):
+    # - features: (num_games, 14) bool array of the state each board is now in. Boards that finished this step
+    #   have already been reset, so their features are those of the new game
+    # - rewards: td_qlearning.reward of the state each board was in and the action taken
+    # - dones: True for boards whose game ended this step
+    # - scores: score of each board after the step (final score for finished boards)
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.intp)
+        rewards = self.rewards(self._features, actions)
+
+        self.direction[:] = actions
+        new_x = self.head_x + ACTION_DX[actions]
+        new_y = self.head_y + ACTION_DY[actions]
+        out_of_bounds = (new_x < 0) | (new_x >= self.cols) | (new_y < 0) | (new_y >= self.rows)
+        new_cell = np.where(out_of_bounds, 0, new_y * self.cols + new_x)
+        # As in SnakeGame, the tail has not moved yet when checking for a collision
+        collision = out_of_bounds | self.occupancy[self._rows, new_cell]
+        ate = ~collision & (new_cell == self.food)
+
+        # Move the head forward on boards still alive
+        moved = np.flatnonzero(~collision)
+        head_position = (self.tail[moved] + self.length[moved]) % self.capacity
+        self.body[moved, head_position] = new_cell[moved]
+        self.occupancy[moved, new_cell[moved]] = True
+        self.length[moved] += 1
+        self.head_x[moved] = new_x[moved]
+        self.head_y[moved] = new_y[moved]
+        self.steps[moved] += 1
+
+        # Pop the tail of snakes that did not eat so their size is maintained
+        popped = np.flatnonzero(~collision & ~ate)
+        self.occupancy[popped, self.body[popped, self.tail[popped]]] = False
+        self.tail[popped] = (self.tail[popped] + 1) % self.capacity
+        self.length[popped] -= 1
+        self.turns_since_last_ate[popped] += 1
+
+        eaten = np.flatnonzero(ate)
+        self.score[eaten] += 1
+        self.turns_since_last_ate[eaten] = 0
+        self._place_food(eaten)
+
+        dones = collision | (self.food < 0)
+        if self.hunger_limit is not None:
+            # run_episode counts the first move of a game as a move without food, but not the move after a meal
+            dones |= self.turns_since_last_ate > self.hunger_limit - (self.score == 0)
+        scores = self.score.copy()
+
+        self._reset_boards(np.flatnonzero(dones))
+        self._features = self.get_state()
+        return self._features, rewards, dones, scores
+
+    # Features of every board, as a (num_games, 14) bool array. Matches SnakeGame.get_state()
+    def get_state(self):
+        features = np.zeros((self.num_games, NUM_FEATURES), dtype=bool)
+        features[self._rows, MOVING + self.direction] = True
+
+        for action in range(len(ACTIONS)):
+            x = self.head_x + ACTION_DX[action]
+            y = self.head_y + ACTION_DY[action]
+            out_of_bounds = (x < 0) | (x >= self.cols) | (y < 0) | (y >= self.rows)
+            cell = np.where(out_of_bounds, 0, y * self.cols + x)
+            features[:, DANGER + action] = out_of_bounds | self.occupancy[self._rows, cell]
+
+        has_food = self.food >= 0
+        food_x = self.food % self.cols
+        food_y = self.food // self.cols
+        features[:, FOOD] = has_food & (food_x > self.head_x)
+        features[:, FOOD + 1] = has_food & (food_x < self.head_x)
+        features[:, FOOD + 2] = has_food & (food_y < self.head_y)
+        features[:, FOOD + 3] = has_food & (food_y > self.head_y)
+        features[:, FOOD_ADJACENT] = has_food & \
+            (np.abs(food_x - self.head_x) + np.abs(food_y - self.head_y) == 1)
+
+        features[:, HUNGRY] = self.turns_since_last_ate > 50
+        return features
+
+    # Vectorized td_qlearning.reward for a batch of (features, action) pairs
+    @staticmethod
+    def rewards(features, actions):
+        rows = np.arange(len(actions))
+        rewards = np.full(len(actions), -1, dtype=np.int32)
+        rewards[features[:, HUNGRY]] = -50
+        rewards[features[rows, DANGER + actions]] = -50
+        rewards[features[:, FOOD_ADJACENT] & features[rows, FOOD + actions]] = 50
+        return rewards
+
+    # Next random 64 bit value from the streams of the boards in indices
+    def _random(self, indices):
+        state = self.rng_state[indices] + SPLITMIX_INCREMENT
+        self.rng_state[indices] = state
+        state = (state ^ (state >> np.uint64(30))) * SPLITMIX_MULTIPLIER_1
+        state = (state ^ (state >> np.uint64(27))) * SPLITMIX_MULTIPLIER_2
+        return state ^ (state >> np.uint64(31))
+
+    # Random ints in [0, n) for the boards in indices (n can differ per board)
+    def _random_below(self, indices, n):
+        # Scale the top 32 bits of the random value to [0, n)
+        return ((self._random(indices) >> np.uint64(32)) * np.asarray(n, dtype=np.uint64) >> np.uint64(32)).astype(
+            np.int64)
+
+    # Place food on a random free cell of each board in indices
+    def _place_food(self, indices):
+        pending = indices
+        for _ in range(FOOD_SAMPLING_ROUNDS):
+            if len(pending) == 0:
+                return
+            cells = self._random_below(pending, self.num_cells)
+            free = ~self.occupancy[pending, cells]
+            self.food[pending[free]] = cells[free]
+            pending = pending[~free]
+
+        # Boards that are nearly full - sample directly from the free cells
+        for i in pending:
+            free_cells = np.flatnonzero(~self.occupancy[i])
+            if len(free_cells) > 0:
+                self.food[i] = free_cells[self._random_below(np.array([i]), len(free_cells))[0]]
+            else:
+                self.food[i] = -1
+
+
+# Converts a (num_games, 14) feature array into int encoded states, as returned by SnakeGame.get_state_code and
+# used as td_qlearning Q-table keys
+def state_codes(features):
+    return features.astype(np.int32) @ FEATURE_WEIGHTS
+
+
+# Converts a (num_games, 14) feature array into State bitstrings
+def feature_bitstrings(features):
+    return ["".join("1" if feature else "0" for feature in row) for row in features]
@@ -0,0 +1,394 @@
+"""
+Throughput benchmarks for the game engine and the learner.
+
+Every benchmark reports microseconds per operation and operations (steps) per second, across board sizes and snake
+lengths where they matter. Results are written to a JSON file, and can be compared against a stored baseline to
+catch regressions:
+
+    python benchmarks.py --output bench.json
+    python benchmarks.py --output new.json --compare bench.json
+
+Games are benchmarked headless, and also rendered (through pygame) with --rendered.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+from batch_game import BatchSnakeGame
+from features import ExtendedFeatures
+from lookup_policy import compile_policy
+from reachability import ReachabilityAnalyser
+from game import SnakeGame, GridSnakeGame, Direction, Point, BLOCK_SIZE, NUM_STATES, NUM_ACTIONS
+from snake_game_AI_agent import SnakeAgent, Q_BACKENDS, td_qlearning
+
+# Boards are given in pixels, as for SnakeGame. Their number of rows must be even (see _hamiltonian_cycle)
+BOARD_SIZES = [(640, 480), (1280, 960), (4096, 4096)]
+SNAKE_LENGTHS = [3, 100, 1000]
+QUICK_BOARD_SIZES = [(640, 480)]
+QUICK_SNAKE_LENGTHS = [3, 100]
+# Grid games are given in cells, and go well beyond what fits on a screen
+GRID_SIZES = [(32, 24), (200, 200), (1000, 1000)]
+QUICK_GRID_SIZES = [(32, 24), (200, 200)]
+# Each benchmark is repeated with more and more operations until it runs for at least this many seconds
+MIN_TIME = 0.2
+# A benchmark regressed if it takes this much longer per operation than in the baseline
+DEFAULT_TOLERANCE = 0.1
+
+
+# Runs run(n), which performs about n operations, with n doubling until it takes at least min_time. run can return
+# the number of operations it actually performed (otherwise n is assumed). If setup is given, it is called (untimed)
+# before every run, e.g. to start each run from a fresh game.
+# Returns a result dict with microseconds per operation and operations per second
+def _measure(run, min_time=MIN_TIME, setup=None):
+    n = 1
+    while True:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        operations = run(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            operations = n if operations is None else operations
+            return {"operations": operations, "us_per_op": elapsed/operations*1e6, "ops_per_sec": operations/elapsed}
+        n *= 2
+
+
+# Cells of a cycle visiting every cell of a cols x rows board once (rows must be even). Rows are swept back and forth
+# over columns 1 to cols - 1, then column 0 leads back to the start
+def _hamiltonian_cycle(cols, rows):
+    cycle = []
+    for row in range(rows):
+        columns = range(1, cols) if row % 2 == 0 else range(cols - 1, 0, -1)
+        cycle.extend(row*cols + col for col in columns)
+    cycle.extend(row*cols for row in range(rows - 1, -1, -1))
+    return cycle
+
+
+# Action int that moves from cell to the adjacent cell next_cell
+def _action_between(cell, next_cell, cols):
+    return {1: 0, -1: 1, -cols: 2, cols: 3}[next_cell - cell]
+
+
+# A game on a w x h board with a snake of the given length laid along a hamiltonian cycle, plus next_action, where
+# next_action[cell] keeps the snake on the cycle, so the game can be stepped indefinitely without dying
+def make_game(w, h, length, seed=0, display=None):
+    game = SnakeGame(display, w=w, h=h, speed=0, seed=seed)
+    cycle = _hamiltonian_cycle(game.cols, game.rows)
+    next_action = [0]*len(cycle)
+    for i, cell in enumerate(cycle):
+        next_action[cell] = _action_between(cell, cycle[(i + 1) % len(cycle)], game.cols)
+
+    for point in game.snake:
+        game._vacate(game._cell(point.x, point.y))
+    body = [cycle[(length - 1 - i) % len(cycle)] for i in range(length)]
+    game.snake.clear()
+    for cell in body:
+        game.snake.append(Point((cell % game.cols)*BLOCK_SIZE, (cell // game.cols)*BLOCK_SIZE))
+        game._occupy(cell)
+    game.head = game.snake[0]
+    game.direction = Direction(_action_between(body[1], body[0], game.cols) + 1)
+    game._place_food()
+    return game, next_action
+
+
+# As make_game, for a GridSnakeGame of cols x rows cells
+def make_grid_game(cols, rows, length, seed=0):
+    game = GridSnakeGame(cols, rows, seed=seed)
+    cycle = _hamiltonian_cycle(cols, rows)
+    next_action = [0]*len(cycle)
+    for i, cell in enumerate(cycle):
+        next_action[cell] = _action_between(cell, cycle[(i + 1) % len(cycle)], cols)
+
+    for cell in game.snake:
+        game._vacate(cell)
+    body = [cycle[(length - 1 - i) % len(cycle)] for i in range(length)]
+    game.snake.clear()
+    for cell in body:
+        game.snake.append(cell)
+        game._occupy(cell)
+    game.head = game.snake[0]
+    game.direction = _action_between(body[1], body[0], cols)
+    game._place_food()
+    return game, next_action
+
+
+# Removes the tail of a snake that just ate, so a benchmark keeps measuring the snake length it is labelled with
+def _keep_length(game, length):
+    if len(game.snake) > length:
+        tail = game.tail_cell()
+        game.snake.pop()
+        game._vacate(tail)
+
+
+def _game_configurations(board_sizes, snake_lengths):
+    for w, h in board_sizes:
+        for length in snake_lengths:
+            # Leave room for the snake to move and for food
+            if length <= (w // BLOCK_SIZE)*(h // BLOCK_SIZE) // 2:
+                yield w, h, length
+
+
+def benchmark_game(board_sizes, snake_lengths, display=None, label=""):
+    results = {}
+    for w, h, length in _game_configurations(board_sizes, snake_lengths):
+        name = "[" + str(w) + "x" + str(h) + ",len=" + str(length) + label + "]"
+        _, next_action = make_game(w, h, length, display=display)
+        state = {}
+        features = ExtendedFeatures()
+        analyser = ReachabilityAnalyser()
+
+        # Every benchmark starts from a fresh game with a snake of the labelled length
+        def setup():
+            state["game"], _ = make_game(w, h, length, display=display)
+            assert len(state["game"].snake) == length
+
+        def play_steps(n):
+            game = state["game"]
+            for _ in range(n):
+                head = game.head
+                game.play_step(next_action[game._cell(head.x, head.y)])
+                _keep_length(game, length)
+
+        # A step and the state code after it, as a learner needs them
+        def steps(n):
+            game = state["game"]
+            for _ in range(n):
+                head = game.head
+                game.step(next_action[game._cell(head.x, head.y)])
+                _keep_length(game, length)
+
+        def get_state_codes(n):
+            game = state["game"]
+            for _ in range(n):
+                game.get_state_code()
+
+        def get_states(n):
+            game = state["game"]
+            for _ in range(n):
+                game.get_state()
+
+        def extended_state_codes(n):
+            game = state["game"]
+            for _ in range(n):
+                features.state_code(game)
+
+        def region_sizes(n):
+            game = state["game"]
+            for _ in range(n):
+                analyser.region_sizes(game)
+
+        def place_foods(n):
+            game = state["game"]
+            for _ in range(n):
+                game._place_food()
+
+        results["SnakeGame.play_step" + name] = _measure(play_steps, setup=setup)
+        if display is None:
+            results["SnakeGame.step" + name] = _measure(steps, setup=setup)
+            results["SnakeGame.get_state_code" + name] = _measure(get_state_codes, setup=setup)
+            results["SnakeGame.get_state" + name] = _measure(get_states, setup=setup)
+            results["ExtendedFeatures.state_code" + name] = _measure(extended_state_codes, setup=setup)
+            results["ReachabilityAnalyser.region_sizes" + name] = _measure(region_sizes, setup=setup)
+            results["SnakeGame._place_food" + name] = _measure(place_foods, setup=setup)
+    return results
+
+
+# Boards are given in cells
+def benchmark_grid_game(grid_sizes, snake_lengths):
+    results = {}
+    for cols, rows in grid_sizes:
+        for length in snake_lengths:
+            if length > cols*rows // 2:
+                continue
+            name = "[" + str(cols) + "x" + str(rows) + " cells,len=" + str(length) + "]"
+            _, next_action = make_grid_game(cols, rows, length)
+            state = {}
+
+            def setup():
+                state["game"], _ = make_grid_game(cols, rows, length)
+                assert len(state["game"].snake) == length
+
+            def play_steps(n):
+                game = state["game"]
+                for _ in range(n):
+                    game.play_step(next_action[game.head])
+                    _keep_length(game, length)
+
+            def steps(n):
+                game = state["game"]
+                for _ in range(n):
+                    game.step(next_action[game.head])
+                    _keep_length(game, length)
+
+            def get_state_codes(n):
+                game = state["game"]
+                for _ in range(n):
+                    game.get_state_code()
+
+            results["GridSnakeGame.play_step" + name] = _measure(play_steps, setup=setup)
+            results["GridSnakeGame.step" + name] = _measure(steps, setup=setup)
+            results["GridSnakeGame.get_state_code" + name] = _measure(get_state_codes, setup=setup)
+    return results
+
+
+def benchmark_learner():
+    results = {}
+    rng = random.Random(0)
+    states = [rng.randrange(NUM_STATES) for _ in range(1000)]
+    actions = [rng.randrange(NUM_ACTIONS) for _ in range(1000)]
+    # A long trial, to measure the per transition cost of update
+    trial = [(state, action) for state, action in zip(states, actions)] + [(states[0], None)]
+
+    def rewards(n):
+        for i in range(n):
+            td_qlearning.reward(states[i % 1000], actions[i % 1000])
+    results["td_qlearning.reward"] = _measure(rewards)
+
+    for backend, q_class in Q_BACKENDS.items():
+        q_function = q_class(0.1, 0.9, 0, 1, 10000)
+
+        def policies(n):
+            for i in range(n):
+                q_function.policy(states[i % 1000])
+
+        def updates(n):
+            # One operation is one transition
+            repeats = max(1, n // len(actions))
+            for _ in range(repeats):
+                q_function.update(trial)
+            return repeats*len(actions)
+
+        results["td_qlearning.policy[" + backend + "]"] = _measure(policies)
+        results["td_qlearning.update[" + backend + "]"] = _measure(updates)
+
+    lookup_policy = compile_policy(q_function)
+
+    def lookup_policies(n):
+        for i in range(n):
+            lookup_policy.policy(states[i % 1000])
+    results["LookupPolicy.policy"] = _measure(lookup_policies)
+    return results
+
+
+# End to end games through SnakeAgent, in steps per second. The agent learns from a few games first so games are
+# not all trivially short
+def benchmark_play_game(render=False):
+    results = {}
+    for backend in Q_BACKENDS:
+        agent = SnakeAgent(q_backend=backend)
+        for seed in range(100):
+            agent.run_episode(SnakeGame(seed=seed))
+        seeds = iter(range(100, 10**9))
+
+        # Whole games are played, so the number of steps is rounded up to the end of the last game
+        def play_games(n):
+            steps = 0
+            while steps < n:
+                game = SnakeGame(_display() if render else None, speed=0, seed=next(seeds))
+                agent.run_episode(game)
+                steps += game.steps
+            return steps
+
+        label = "[" + backend + (",rendered" if render else "") + "]"
+        results["SnakeAgent.play_game" + label] = _measure(play_games)
+    return results
+
+
+def benchmark_batch_game(board_sizes, num_games=1024):
+    results = {}
+    for w, h in board_sizes:
+        batch = BatchSnakeGame(num_games, w=w, h=h, seed=0)
+        actions = np.random.default_rng(0).integers(0, NUM_ACTIONS, size=(64, num_games))
+
+        # One operation is one step of one board
+        def steps(n):
+            repeats = max(1, n // num_games)
+            for i in range(repeats):
+                batch.step(actions[i % 64])
+            return repeats*num_games
+
+        name = "BatchSnakeGame.step[" + str(w) + "x" + str(h) + ",n=" + str(num_games) + "]"
+        results[name] = _measure(steps)
+    return results
+
+
+_displays = {}
+
+
+def _display(w=640, h=480):
+    # Imported here so that headless benchmarks never require pygame
+    import pygame
+    if (w, h) not in _displays:
+        pygame.init()
+        _displays[(w, h)] = pygame.display.set_mode((w, h))
+    return _displays[(w, h)]
+
+
+def run_benchmarks(quick=False, rendered=False):
+    board_sizes = QUICK_BOARD_SIZES if quick else BOARD_SIZES
+    snake_lengths = QUICK_SNAKE_LENGTHS if quick else SNAKE_LENGTHS
+    results = {}
+    results.update(benchmark_game(board_sizes, snake_lengths))
+    results.update(benchmark_grid_game(QUICK_GRID_SIZES if quick else GRID_SIZES, snake_lengths))
+    results.update(benchmark_learner())
+    results.update(benchmark_play_game())
+    results.update(benchmark_batch_game(board_sizes))
+    if rendered:
+        # Rendered games are limited to boards that fit on a screen
+        results.update(benchmark_game(QUICK_BOARD_SIZES, snake_lengths, display=_display(), label=",rendered"))
+        results.update(benchmark_play_game(render=True))
+    return results
+
+
+# Compares results against baseline results. Returns the names of benchmarks that got slower by more than tolerance
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        ratio = results[name]["us_per_op"]/baseline[name]["us_per_op"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(name.ljust(60), "%10.3f us -> %10.3f us  (x%.2f)%s" % (baseline[name]["us_per_op"],
+                                                                    results[name]["us_per_op"], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step throughput benchmarks for the game engine and learner")
+    parser.add_argument("--output", default="benchmark_results.json", help="file to write results to (JSON)")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown per operation that counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="only benchmark the smallest board sizes")
+    parser.add_argument("--rendered", action="store_true", help="also benchmark rendered games (needs pygame)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(quick=args.quick, rendered=args.rendered)
+    file = open(args.output, "w")
+    json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results}, file,
+              indent=2)
+    file.close()
+
+    if args.compare:
+        file = open(args.compare)
+        baseline = json.load(file)["results"]
+        file.close()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(len(regressions), "benchmark(s) regressed")
+            sys.exit(1)
+    else:
+        for name, result in results.items():
+            print(name.ljust(60), "%10.3f us/op  %14.1f ops/sec" % (result["us_per_op"], result["ops_per_sec"]))
+
+
+if __name__ == '__main__':
+    main()
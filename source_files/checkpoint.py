@@ -0,0 +1,89 @@
+"""
+Compact agent checkpoints. A checkpoint is a directory holding:
+-q_values.npy: float32 array of q-values, indexed by [state, action]
+-number_of_visits.npy: int32 array of visit counts, indexed by [state, action]
+-header.json: hyperparameters and the number of games the agent had played
+
+Loading memory-maps the arrays, so evaluation workers can share one checkpoint without each copying it, and needs
+no training code (see SnakeAgent.from_checkpoint to turn a checkpoint back into an agent).
+"""
+
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+HEADER_FILE = "header.json"
+Q_VALUES_FILE = "q_values.npy"
+VISITS_FILE = "number_of_visits.npy"
+FORMAT_VERSION = 1
+
+# Hyperparameters of td_qlearning that are stored in the header
+HYPERPARAMETERS = ["alpha", "gamma", "init_q_value", "visits_threshold", "R_plus"]
+
+
+class Checkpoint:
+
+    def __init__(self, header, q_values, number_of_visits):
+        self.header = header
+        self.q_values = q_values
+        self.number_of_visits = number_of_visits
+
+    def hyperparameters(self):
+        return {name: self.header[name] for name in HYPERPARAMETERS}
+
+
+# Writes a checkpoint to the directory path (created if needed). hyperparameters holds the values listed in
+# HYPERPARAMETERS
+def save_checkpoint(path, q_values, number_of_visits, hyperparameters, games_played=0):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, Q_VALUES_FILE), np.asarray(q_values, dtype=np.float32))
+    np.save(os.path.join(path, VISITS_FILE), np.asarray(number_of_visits, dtype=np.int32))
+
+    header = {"format_version": FORMAT_VERSION, "games_played": games_played,
+              "num_states": len(q_values), "num_actions": len(q_values[0])}
+    for name in HYPERPARAMETERS:
+        header[name] = hyperparameters[name]
+    file = open(os.path.join(path, HEADER_FILE), "w")
+    json.dump(header, file, indent=2)
+    file.close()
+
+
+# Reads the checkpoint in the directory path. With mmap_mode="r" the arrays are read-only memory maps of the files;
+# pass mmap_mode=None to load writable copies (e.g. to continue training)
+def load_checkpoint(path, mmap_mode="r"):
+    file = open(os.path.join(path, HEADER_FILE))
+    header = json.load(file)
+    file.close()
+    if header["format_version"] != FORMAT_VERSION:
+        raise ValueError("Unsupported checkpoint format version: " + str(header["format_version"]))
+    q_values = np.load(os.path.join(path, Q_VALUES_FILE), mmap_mode=mmap_mode)
+    number_of_visits = np.load(os.path.join(path, VISITS_FILE), mmap_mode=mmap_mode)
+    return Checkpoint(header, q_values, number_of_visits)
+
+
+def is_checkpoint(path):
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+
+# Converts a pickled SnakeAgent (as written by SnakeAgent.save) to a checkpoint. The number of games played is
+# taken from file names like agent_50_games.pickle. Unpickling requires the training code
+def convert_pickle(pickle_path, checkpoint_path=None):
+    # Imported here so that loading checkpoints never requires the training code
+    from snake_game_AI_agent import SnakeAgent
+
+    agent = SnakeAgent.load(pickle_path)
+    match = re.search(r"agent_(\d+)_games", os.path.basename(pickle_path))
+    games_played = int(match.group(1)) if match else 0
+    if checkpoint_path is None:
+        checkpoint_path = os.path.splitext(pickle_path)[0] + ".ckpt"
+    agent.save_checkpoint(checkpoint_path, games_played)
+    return checkpoint_path
+
+
+if __name__ == '__main__':
+    # Convert every existing agent pickle to a checkpoint next to it
+    for pickle_path in sorted(glob.glob("./agent_data/set_*/*.pickle")):
+        print(pickle_path, "->", convert_pickle(pickle_path))
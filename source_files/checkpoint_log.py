@@ -0,0 +1,123 @@
+"""
+Append-only checkpoint log for long training runs. A log is a directory holding:
+-log.bin: records appended one after another. A full record holds the whole q-value and visit arrays, a delta record
+ only the entries that changed since the previous record (flat indices followed by their new values)
+-index.jsonl: one line per record - games played, kind ("full" or "delta") and the record's offset in log.bin
+-header.json: hyperparameters and table shape, written with the first record
+
+Writing a checkpoint costs time and space proportional to what changed since the last one, and checkpoint N is
+rebuilt from the last full record at or before N plus the deltas after it (at most full_every - 1 of them).
+"""
+
+import json
+import os
+
+import numpy as np
+from checkpoint import Checkpoint, FORMAT_VERSION, HYPERPARAMETERS, save_checkpoint
+
+LOG_FILE = "log.bin"
+INDEX_FILE = "index.jsonl"
+HEADER_FILE = "header.json"
+
+
+class CheckpointLog:
+
+    # Opens the log in the directory path, creating it if needed. Every full_every-th record is a full snapshot
+    def __init__(self, path, full_every=10):
+        self.path = path
+        self.full_every = full_every
+        os.makedirs(path, exist_ok=True)
+
+        self.index = []
+        if os.path.isfile(os.path.join(path, INDEX_FILE)):
+            file = open(os.path.join(path, INDEX_FILE))
+            self.index = [json.loads(line) for line in file if line.strip()]
+            file.close()
+        self.header = None
+        if os.path.isfile(os.path.join(path, HEADER_FILE)):
+            file = open(os.path.join(path, HEADER_FILE))
+            self.header = json.load(file)
+            file.close()
+
+        # Arrays as of the last record, to find what changed. Rebuilt from the log when appending to an existing one
+        self._previous_q_values = None
+        self._previous_visits = None
+
+    def games_played(self):
+        return [record["games_played"] for record in self.index]
+
+    # Appends a checkpoint of the arrays after games_played games (see checkpoint.save_checkpoint for arguments)
+    def append(self, q_values, number_of_visits, hyperparameters, games_played):
+        q_values = np.asarray(q_values, dtype=np.float32)
+        number_of_visits = np.asarray(number_of_visits, dtype=np.int32)
+        if self.header is None:
+            self._write_header(q_values, hyperparameters)
+        if self.index and self._previous_q_values is None:
+            latest = self.load(self.index[-1]["games_played"])
+            self._previous_q_values = latest.q_values
+            self._previous_visits = latest.number_of_visits
+
+        records_since_full = 0
+        for record in reversed(self.index):
+            if record["kind"] == "full":
+                break
+            records_since_full += 1
+        full = not self.index or records_since_full + 1 >= self.full_every
+
+        log = open(os.path.join(self.path, LOG_FILE), "ab")
+        offset = log.tell()
+        if full:
+            np.save(log, q_values)
+            np.save(log, number_of_visits)
+        else:
+            changed = np.flatnonzero((q_values != self._previous_q_values) |
+                                     (number_of_visits != self._previous_visits)).astype(np.int32)
+            np.save(log, changed)
+            np.save(log, q_values.ravel()[changed])
+            np.save(log, number_of_visits.ravel()[changed])
+        log.close()
+
+        record = {"games_played": games_played, "kind": "full" if full else "delta", "offset": offset}
+        index = open(os.path.join(self.path, INDEX_FILE), "a")
+        index.write(json.dumps(record) + "\n")
+        index.close()
+        self.index.append(record)
+        self._previous_q_values = q_values.copy()
+        self._previous_visits = number_of_visits.copy()
+
+    # Rebuilds the checkpoint recorded after games_played games
+    def load(self, games_played):
+        position = self.games_played().index(games_played)
+        start = position
+        while self.index[start]["kind"] != "full":
+            start -= 1
+
+        log = open(os.path.join(self.path, LOG_FILE), "rb")
+        log.seek(self.index[start]["offset"])
+        q_values = np.load(log)
+        number_of_visits = np.load(log)
+        for record in self.index[start + 1:position + 1]:
+            log.seek(record["offset"])
+            changed = np.load(log)
+            q_values.ravel()[changed] = np.load(log)
+            number_of_visits.ravel()[changed] = np.load(log)
+        log.close()
+
+        header = dict(self.header)
+        header["games_played"] = games_played
+        return Checkpoint(header, q_values, number_of_visits)
+
+    # Writes the checkpoint recorded after games_played games as a regular checkpoint directory (e.g. to evaluate it)
+    def export(self, games_played, checkpoint_path):
+        checkpoint = self.load(games_played)
+        save_checkpoint(checkpoint_path, checkpoint.q_values, checkpoint.number_of_visits,
+                        checkpoint.hyperparameters(), games_played)
+
+    def _write_header(self, q_values, hyperparameters):
+        self.header = {"format_version": FORMAT_VERSION, "num_states": q_values.shape[0],
+                       "num_actions": q_values.shape[1]}
+        for name in HYPERPARAMETERS:
+            self.header[name] = hyperparameters[name]
+        file = open(os.path.join(self.path, HEADER_FILE), "w")
+        json.dump(self.header, file, indent=2)
+        file.close()
@@ -0,0 +1,112 @@
+"""
+Evaluates saved agents by playing many headless games per checkpoint across a pool of worker processes.
+
+Every game played is written as one JSON line to a results file as soon as its batch completes (checkpoint, seed,
+score, length, steps and death cause), and summary statistics are reported per checkpoint.
+"""
+
+import json
+import math
+import multiprocessing
+import statistics
+
+from checkpoint import is_checkpoint
+from game import SnakeGame, generate_food_sequence
+from lookup_policy import LookupPolicy
+from snake_game_AI_agent import SnakeAgent, SCREEN_WIDTH, SCREEN_HEIGHT
+
+# z value for 95% confidence intervals
+Z_95 = 1.96
+
+# Agents already loaded by this worker process, keyed by checkpoint path
+_loaded_agents = dict()
+
+
+# checkpoint is either a checkpoint directory (see checkpoint.py), which is memory-mapped so all workers share it,
+# an agent pickle, or a policy saved by LookupPolicy.save (a .npy file). Agents are compiled to a LookupPolicy, which
+# plays exactly the same moves, unless they use a safe policy
+def _load_agent(checkpoint):
+    if checkpoint not in _loaded_agents:
+        if checkpoint.endswith(".npy"):
+            agent = LookupPolicy.load(checkpoint)
+        else:
+            if is_checkpoint(checkpoint):
+                agent = SnakeAgent.from_checkpoint(checkpoint)
+            else:
+                agent = SnakeAgent.load(checkpoint)
+            # We no longer want the agent to explore - it is now just performing
+            agent.q_function.visits_threshold = 0
+            if agent.safe_policy is None:
+                agent = agent.compile_policy()
+        _loaded_agents[checkpoint] = agent
+    return _loaded_agents[checkpoint]
+
+
+# Runs in a worker process - plays one game of the checkpoint's agent for each seed, returning a record per game
+def _play_games(args):
+    checkpoint, seeds, food_sequence_length = args
+    agent = _load_agent(checkpoint)
+    records = []
+    for seed in seeds:
+        food_sequence = None
+        if food_sequence_length > 0:
+            food_sequence = generate_food_sequence(seed, food_sequence_length, SCREEN_WIDTH, SCREEN_HEIGHT)
+        game = SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, seed=seed, food_sequence=food_sequence)
+        if isinstance(agent, LookupPolicy):
+            agent.run_episode(game)
+        else:
+            agent.run_episode(game, learn=False)
+        records.append({
+            "checkpoint": checkpoint,
+            "seed": seed,
+            "score": game.score,
+            # The snake grows by one with every food eaten
+            "length": 3 + game.score,
+            "steps": game.steps,
+            # A game that is not over was stopped because the snake went too long without eating
+            "death_cause": game.death_cause if game.game_over else "starved",
+        })
+    return records
+
+
+# Mean, median, standard deviation and 95% confidence interval of the mean for a list of scores
+def summarize(scores):
+    mean = statistics.mean(scores)
+    stdev = statistics.stdev(scores) if len(scores) > 1 else 0.0
+    margin = Z_95*stdev/math.sqrt(len(scores))
+    return {
+        "games": len(scores),
+        "mean": mean,
+        "median": statistics.median(scores),
+        "stdev": stdev,
+        "ci_low": mean - margin,
+        "ci_high": mean + margin,
+    }
+
+
+# Plays games_per_checkpoint games for every checkpoint (checkpoint directory, agent pickle path or saved policy),
+# using game seeds base_seed, base_seed + 1, ... for each checkpoint so all checkpoints start from the same games. If
+# food_sequence_length is greater than 0, every game also gets a precomputed food sequence of that length generated
+# from its seed, so checkpoints see food in the same places for (at least) that many foods, and results can be
+# compared game by game. Games are played in batches of batch_size by num_workers processes (defaults to the number
+# of cores). Per game records are appended to results_file as they complete. Returns a dict of
+# checkpoint : summarize(scores)
+def evaluate(checkpoints, games_per_checkpoint=1000, results_file="evaluation_results.jsonl", num_workers=None,
+             batch_size=50, base_seed=0, food_sequence_length=0):
+    tasks = []
+    for checkpoint in checkpoints:
+        for start in range(0, games_per_checkpoint, batch_size):
+            end = min(start + batch_size, games_per_checkpoint)
+            tasks.append((checkpoint, list(range(base_seed + start, base_seed + end)), food_sequence_length))
+
+    scores = {checkpoint: [] for checkpoint in checkpoints}
+    file = open(results_file, "a")
+    with multiprocessing.Pool(num_workers or multiprocessing.cpu_count()) as pool:
+        for records in pool.imap_unordered(_play_games, tasks):
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+                scores[record["checkpoint"]].append(record["score"])
+            file.flush()
+    file.close()
+
+    return {checkpoint: summarize(checkpoint_scores) for checkpoint, checkpoint_scores in scores.items()}
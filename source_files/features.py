@@ -0,0 +1,90 @@
+"""
+Pluggable state encodings. A feature set turns a SnakeGame (or GridSnakeGame) into an int state code, and knows how
+many codes there are (num_states), so a q-function can be sized and indexed for whichever encoding is active (see
+SnakeAgent).
+
+-BasicFeatures: the 14 features of game.STATE_FEATURES
+-ExtendedFeatures: the 14 basic features in the low bits, plus optional extra features above them for bigger boards:
+ danger two cells away, the direction of the tail, and whether moving into a cell leads into a region with less free
+ space than the snake's length (a flood fill bounded by the snake's length)
+
+The basic features always keep their bits, so anything that only reads basic features (e.g. td_qlearning.reward)
+works on any encoding. Extra features look cells up through precomputed neighbour tables instead of comparing
+positions, and the flood fill is done by a reachability.ReachabilityAnalyser.
+"""
+
+from game import NUM_ACTIONS, NUM_STATES, NUM_STATE_FEATURES, STATE_FEATURES, neighbour_table
+from reachability import ReachabilityAnalyser
+
+
+class BasicFeatures:
+
+    names = STATE_FEATURES
+    num_states = NUM_STATES
+
+    def state_code(self, game):
+        return game.get_state_code()
+
+
+class ExtendedFeatures(BasicFeatures):
+
+    # Each extra feature can be switched off to keep the number of states down. With all of them the code has 24 bits
+    # (2**24 states), which is fine for the dict backend, but needs 2**24 x NUM_ACTIONS entries with the array backend
+    def __init__(self, danger_2=True, tail_direction=True, free_space=True):
+        self.danger_2 = danger_2
+        self.tail_direction = tail_direction
+        self.free_space = free_space
+
+        # Names of the features, most significant bit first as for STATE_FEATURES. Features with one bit per direction
+        # have the right direction as their most significant bit, also as for STATE_FEATURES
+        names = STATE_FEATURES
+        if danger_2:
+            names = ("danger_2_right", "danger_2_left", "danger_2_up", "danger_2_down") + names
+        if tail_direction:
+            # The action (index into ACTIONS) that points most directly from the head to the tail
+            names = ("tail_direction_high", "tail_direction_low") + names
+        if free_space:
+            names = ("trapped_right", "trapped_left", "trapped_up", "trapped_down") + names
+        self.names = names
+        self.num_states = 1 << len(self.names)
+
+        self.analyser = ReachabilityAnalyser()
+
+    def state_code(self, game):
+        code = game.get_state_code()
+        # After a collision with a wall the head is off the board. That state is terminal, so only its basic features
+        # (used for the reward) matter
+        head = game.head_cell()
+        if head < 0:
+            return code
+        neighbours = neighbour_table(game.cols, game.rows)
+        occupancy = game._occupancy
+        bit = 1 << NUM_STATE_FEATURES
+
+        if self.danger_2:
+            for action in range(NUM_ACTIONS):
+                cell = neighbours[head*NUM_ACTIONS + action]
+                if cell >= 0:
+                    cell = neighbours[cell*NUM_ACTIONS + action]
+                if cell < 0 or occupancy[cell]:
+                    code |= bit << (NUM_ACTIONS - 1 - action)
+            bit <<= NUM_ACTIONS
+
+        if self.tail_direction:
+            tail = game.tail_cell()
+            dx = tail % game.cols - head % game.cols
+            dy = tail // game.cols - head // game.cols
+            if abs(dx) >= abs(dy):
+                action = 0 if dx > 0 else 1
+            else:
+                action = 2 if dy < 0 else 3
+            code |= action*bit
+            bit <<= 2
+
+        if self.free_space:
+            length = len(game.snake)
+            for action, size in enumerate(self.analyser.region_sizes(game, length)):
+                if 0 < size < length:
+                    code |= bit << (NUM_ACTIONS - 1 - action)
+
+        return code
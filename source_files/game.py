@@ -4,23 +4,18 @@ What we want:
  Otherwise, the game is frozen
 -Also should have a function get_state()
 -i.e SnakeGame takes in a display for where to play out a game, where we pass in moves one at a time
+-The simulation itself has no pygame dependency. Rendering is an optional observer (see game_renderer.py) that is
+ notified after every step, so training/evaluation can run headless without a display or SDL
 
 """
 
-import pygame
 import random
+from array import array
 from enum import Enum
-from collections import namedtuple
+from collections import namedtuple, deque
 
 Point = namedtuple('Point', 'x, y')
 
-# rgb colors
-WHITE = (255, 255, 255)
-RED = (200,0,0)
-BLUE1 = (0, 0, 255)
-BLUE2 = (0, 100, 255)
-BLACK = (0,0,0)
-
 BLOCK_SIZE = 20
 
 
@@ -30,11 +25,90 @@ class Direction(Enum):
     UP = 3
     DOWN = 4
 
+# Actions are encoded as small ints - action i is ACTIONS[i], and moves the snake in Direction(i + 1)
+ACTIONS = ["right", "left", "up", "down"]
+NUM_ACTIONS = len(ACTIONS)
+# DIRECTIONS[action] is Direction(action + 1), and DIRECTION_DELTAS[action] the pixel offset of a move in it
+DIRECTIONS = [Direction(action + 1) for action in range(NUM_ACTIONS)]
+DIRECTION_DELTAS = [(BLOCK_SIZE, 0), (-BLOCK_SIZE, 0), (0, -BLOCK_SIZE), (0, BLOCK_SIZE)]
+
+# Rewards of a step (see SnakeGame.step). They match td_qlearning.reward of the state before the step and the
+# action taken
+FOOD_REWARD = 50
+DEATH_REWARD = -50
+HUNGRY_REWARD = -50
+STEP_REWARD = -1
+
+# States are encoded as 14 bit ints, one bit per feature. The first feature is the most significant bit, so an
+# encoded state written in binary is exactly the state's bitstring
+STATE_FEATURES = ("snake_moving_right", "snake_moving_left", "snake_moving_up", "snake_moving_down",
+                  "danger_right", "danger_left", "danger_up", "danger_down",
+                  "food_right", "food_left", "food_up", "food_down",
+                  "food_adjacent", "hungry")
+NUM_STATE_FEATURES = len(STATE_FEATURES)
+NUM_STATES = 1 << NUM_STATE_FEATURES
+
+# Bits of the features, indexed by action where there is one feature per direction
+MOVING_BITS = [1 << 13, 1 << 12, 1 << 11, 1 << 10]
+DANGER_BITS = [1 << 9, 1 << 8, 1 << 7, 1 << 6]
+FOOD_BITS = [1 << 5, 1 << 4, 1 << 3, 1 << 2]
+FOOD_ADJACENT_BIT = 1 << 1
+HUNGRY_BIT = 1
+
+
+# A precomputed list of food positions, uniformly random over a w x h board. Passing the same sequence to several
+# games (see SnakeGame) makes them place food in the same order, e.g. to compare two agents on identical games
+def generate_food_sequence(seed, length, w=640, h=480):
+    rng = random.Random(seed)
+    return [Point(rng.randrange(w // BLOCK_SIZE) * BLOCK_SIZE, rng.randrange(h // BLOCK_SIZE) * BLOCK_SIZE)
+            for _ in range(length)]
+
+
+# (cols, rows) -> neighbour table of that board size, built on first use
+_neighbour_tables = dict()
+
+
+# neighbour_table(cols, rows)[cell*NUM_ACTIONS + action] is the cell reached by moving from cell in the direction of
+# action, or -1 if that move leaves the board. Cells are indexed by row * cols + col
+def neighbour_table(cols, rows):
+    if (cols, rows) not in _neighbour_tables:
+        table = array("i", [-1])*(cols*rows*NUM_ACTIONS)
+        for cell in range(cols*rows):
+            col = cell % cols
+            row = cell // cols
+            if col + 1 < cols:
+                table[cell*NUM_ACTIONS] = cell + 1
+            if col > 0:
+                table[cell*NUM_ACTIONS + 1] = cell - 1
+            if row > 0:
+                table[cell*NUM_ACTIONS + 2] = cell - cols
+            if row + 1 < rows:
+                table[cell*NUM_ACTIONS + 3] = cell + cols
+        _neighbour_tables[(cols, rows)] = table
+    return _neighbour_tables[(cols, rows)]
+
+
+def bitstring_to_code(bitstring):
+    return int(bitstring, 2)
+
+
+def code_to_bitstring(code):
+    return format(code, "0" + str(NUM_STATE_FEATURES) + "b")
+
+
 # Represents a state in the game. Can be thought of as composed of multiple features, each True or False
 # Note 1: ** This may be an indirect way of defining basis functions ? ** - reflect later
 # Note 2: Do we need to consider direction snake is moving in? Maybe not
+# Note 3: Learning works with the integer encoding of a state (see SnakeGame.get_state_code). This class is a
+# readable view of it
 class State:
 
+    __slots__ = STATE_FEATURES
+
+    @classmethod
+    def from_code(cls, code):
+        return cls(code_to_bitstring(code))
+
     def __init__(self, bitstring="00000000000000"):
         # Values need to be corrected afterwards
         self.snake_moving_right = (bitstring[0] == "1")
@@ -60,6 +134,9 @@ class State:
                str(int(self.food_up)) + str(int(self.food_down)) + str(int(self.food_adjacent)) + \
                str(int(self.hungry))
 
+    def code(self):
+        return bitstring_to_code(self.bitstring())
+
     # For debugging purposes
     def __str__(self):
         string = "State:\n"
@@ -81,126 +158,230 @@ class State:
 
 class SnakeGame:
 
-    def __init__(self, display, w=640, h=480, speed=20):
-        pygame.init()
-        self.font = pygame.font.SysFont('arial', 25)
+    # If a display is passed in, a pygame renderer is attached to it. With display=None the game runs headless
+    # Every game has its own random number generator, so the same seed always gives the same game for the same moves.
+    # If food_sequence (see generate_food_sequence) is given, food is placed at the next position in it that is not
+    # occupied by the snake, and randomly once it runs out
+    def __init__(self, display=None, w=640, h=480, speed=20, seed=None, food_sequence=None):
         self.w = w
         self.h = h
-        # init display
-        self.display = pygame.display.set_mode((self.w, self.h))
-        pygame.display.set_caption('Snake')
-        self.clock = pygame.time.Clock()
         self.speed = speed
+        self.rng = random.Random(seed)
+        self._food_sequence = food_sequence
+        self._food_sequence_index = 0
+        # Observers are notified (via observer.update(game)) whenever the game state is ready to be displayed
+        self.observers = []
+
+        # The board is a grid of cols x rows cells. Cells are indexed by row * cols + col
+        self.cols = self.w // BLOCK_SIZE
+        self.rows = self.h // BLOCK_SIZE
+        # occupancy[cell] is 1 if a snake body part is in that cell
+        self._occupancy = bytearray(self.cols * self.rows)
+        # Unoccupied cells, kept in a list so one can be sampled in O(1). _free_cell_positions[cell] is the index of
+        # the cell in _free_cells (or -1 if occupied), which allows O(1) removal by swapping with the last element
+        self._free_cells = list(range(self.cols * self.rows))
+        self._free_cell_positions = list(range(self.cols * self.rows))
 
         # init game state
         self.direction = Direction.RIGHT
 
         self.head = Point(self.w/2, self.h/2)
-        self.snake = [self.head,
-                      Point(self.head.x-BLOCK_SIZE, self.head.y),
-                      Point(self.head.x-(2*BLOCK_SIZE), self.head.y)]
+        self.snake = deque([self.head,
+                            Point(self.head.x-BLOCK_SIZE, self.head.y),
+                            Point(self.head.x-(2*BLOCK_SIZE), self.head.y)])
+        for point in self.snake:
+            self._occupy(self._cell(point.x, point.y))
+
+        self.game_over = False
+        # Why the game ended - "wall", "body" or "board_full" (None while the game is still going)
+        self.death_cause = None
 
         self.score = 0
         self.food = None
         self._place_food()
         self.turns_since_last_ate = 0
+        self.steps = 0
 
-        self.game_over = False
-        self._update_ui()
+        if display is not None:
+            # Imported here so that headless games never require pygame
+            from game_renderer import GameRenderer
+            self.attach_observer(GameRenderer(display, speed=speed))
+
+    def attach_observer(self, observer):
+        self.observers.append(observer)
+        observer.update(self)
+
+    def detach_observer(self, observer):
+        self.observers.remove(observer)
 
     def get_state(self):
-        state = State()
-
-        if self.direction == Direction.RIGHT:
-            state.snake_moving_right = True
-        elif self.direction == Direction.LEFT:
-            state.snake_moving_left = True
-        elif self.direction == Direction.DOWN:
-            state.snake_moving_down = True
-        elif self.direction == Direction.UP:
-            state.snake_moving_up = True
-
-        if self._is_obstacle(self.head.x - BLOCK_SIZE, self.head.y):
-            state.danger_left = True
-        if self._is_obstacle(self.head.x + BLOCK_SIZE, self.head.y):
-            state.danger_right = True
-        if self._is_obstacle(self.head.x, self.head.y - BLOCK_SIZE):
-            state.danger_up = True
-        if self._is_obstacle(self.head.x, self.head.y + BLOCK_SIZE):
-            state.danger_down = True
-
-        if self.head.x > self.food.x:
-            state.food_left = True
-        if self.head.x < self.food.x:
-            state.food_right = True
-        if self.head.y > self.food.y:
-            state.food_up = True
-        if self.head.y < self.food.y:
-            state.food_down = True
-
-        if (self.head.x + BLOCK_SIZE, self.head.y) == (self.food.x, self.food.y) or \
-                (self.head.x - BLOCK_SIZE, self.head.y) == (self.food.x, self.food.y) or \
-                (self.head.x, self.head.y + BLOCK_SIZE) == (self.food.x, self.food.y) or \
-                (self.head.x, self.head.y - BLOCK_SIZE) == (self.food.x, self.food.y):
-            state.food_adjacent = True
+        return State.from_code(self.get_state_code())
+
+    # The current state, encoded as an int (see STATE_FEATURES)
+    def get_state_code(self):
+        x = self.head.x
+        y = self.head.y
+        code = MOVING_BITS[self.direction.value - 1]
+
+        # The same checks as _is_obstacle for the four cells around the head, inlined
+        max_x = self.w - BLOCK_SIZE
+        max_y = self.h - BLOCK_SIZE
+        occupancy = self._occupancy
+        if 0 <= y <= max_y:
+            row = (int(y) // BLOCK_SIZE) * self.cols
+            right = x + BLOCK_SIZE
+            left = x - BLOCK_SIZE
+            if right > max_x or right < 0 or occupancy[row + int(right) // BLOCK_SIZE]:
+                code |= DANGER_BITS[0]
+            if left > max_x or left < 0 or occupancy[row + int(left) // BLOCK_SIZE]:
+                code |= DANGER_BITS[1]
+        else:
+            code |= DANGER_BITS[0] | DANGER_BITS[1]
+        if 0 <= x <= max_x:
+            col = int(x) // BLOCK_SIZE
+            up = y - BLOCK_SIZE
+            down = y + BLOCK_SIZE
+            if up > max_y or up < 0 or occupancy[(int(up) // BLOCK_SIZE) * self.cols + col]:
+                code |= DANGER_BITS[2]
+            if down > max_y or down < 0 or occupancy[(int(down) // BLOCK_SIZE) * self.cols + col]:
+                code |= DANGER_BITS[3]
+        else:
+            code |= DANGER_BITS[2] | DANGER_BITS[3]
+
+        # No food left once the snake has filled the board
+        if self.food is not None:
+            if x < self.food.x:
+                code |= FOOD_BITS[0]
+            if x > self.food.x:
+                code |= FOOD_BITS[1]
+            if y > self.food.y:
+                code |= FOOD_BITS[2]
+            if y < self.food.y:
+                code |= FOOD_BITS[3]
+            if abs(x - self.food.x) + abs(y - self.food.y) == BLOCK_SIZE:
+                code |= FOOD_ADJACENT_BIT
 
         if self.turns_since_last_ate > 50:
-            state.hungry = True
+            code |= HUNGRY_BIT
 
-        return state
+        return code
 
+    # Cell of the head, or -1 if the head is off the board (after a collision with a wall)
+    def head_cell(self):
+        if self.head.x > self.w - BLOCK_SIZE or self.head.x < 0 or self.head.y > self.h - BLOCK_SIZE or self.head.y < 0:
+            return -1
+        return self._cell(self.head.x, self.head.y)
+
+    def tail_cell(self):
+        return self._cell(self.snake[-1].x, self.snake[-1].y)
+
+    # Index of the grid cell containing the pixel position (x_pos, y_pos). Position must be within the board
+    def _cell(self, x_pos, y_pos):
+        return (int(y_pos) // BLOCK_SIZE) * self.cols + int(x_pos) // BLOCK_SIZE
+
+    def _occupy(self, cell):
+        self._occupancy[cell] = 1
+        # Swap the cell with the last free cell, then remove it from the end of the list
+        position = self._free_cell_positions[cell]
+        last_cell = self._free_cells[-1]
+        self._free_cells[position] = last_cell
+        self._free_cell_positions[last_cell] = position
+        self._free_cells.pop()
+        self._free_cell_positions[cell] = -1
+
+    def _vacate(self, cell):
+        self._occupancy[cell] = 0
+        self._free_cell_positions[cell] = len(self._free_cells)
+        self._free_cells.append(cell)
+
+    # Food is placed uniformly at random on a cell not occupied by the snake (or taken from the food sequence)
     def _place_food(self):
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        self.food = Point(x, y)
-        if self.food in self.snake:
-            self._place_food()
-
-    # 4 possible actions - Move left, right, up or down. Can pass in either a string or a Direction instance
+        # The snake fills the whole board - there is nowhere left to go
+        if not self._free_cells:
+            self.food = None
+            self.game_over = True
+            self.death_cause = "board_full"
+            return
+        if self._food_sequence is not None:
+            while self._food_sequence_index < len(self._food_sequence):
+                food = self._food_sequence[self._food_sequence_index]
+                self._food_sequence_index += 1
+                if not self._occupancy[self._cell(food.x, food.y)]:
+                    self.food = Point(food.x, food.y)
+                    return
+        cell = self._free_cells[self.rng.randrange(len(self._free_cells))]
+        self.food = Point((cell % self.cols) * BLOCK_SIZE, (cell // self.cols) * BLOCK_SIZE)
+
+    # 4 possible actions - Move left, right, up or down. Can pass in either a string, an action int (index into
+    # ACTIONS) or a Direction instance
     def play_step(self, action):
 
         if self.game_over:
             return
 
-        # Check if action passed in is a string or Direction instance
+        # Check if action passed in is a string, int or Direction instance
         if isinstance(action, Direction):
-            self.direction = Direction(action)
+            action = action.value - 1
+        elif isinstance(action, int):
+            if not 0 <= action < NUM_ACTIONS:
+                return
         else:
-            possible_actions = ["right", "left", "up", "down"]
-            if action not in possible_actions:
+            if action not in ACTIONS:
                 return
-            # Update direction based on the action
-            direction_enum_value = possible_actions.index(action) + 1
-            self.direction = Direction(direction_enum_value)
-        self._move()
+            action = ACTIONS.index(action)
+        self._advance(action)
+
+    # Lean stepping API - plays the action int (index into ACTIONS) and returns (state code, reward, done), where the
+    # reward is one of the *_REWARD constants. Raises ValueError if the game is already over
+    def step(self, action):
+        if self.game_over:
+            raise ValueError("step called on a game that is over")
+        reward = self._advance(action)
+        return self.get_state_code(), reward, self.game_over
+
+    # Plays the action int and returns its reward
+    def _advance(self, action):
+        hungry = self.turns_since_last_ate > 50
+        self.direction = DIRECTIONS[action]
+        delta_x, delta_y = DIRECTION_DELTAS[action]
+        x = self.head.x + delta_x
+        y = self.head.y + delta_y
+        # head (and every snake segment) is a Point that renderers and features read, so this Point is the one object
+        # a step has to create. GridSnakeGame stores cells instead and creates none
+        self.head = Point(x, y)
+        self.snake.appendleft(self.head)
+        self.steps += 1
 
-        # Check if game over
-        if self._is_collision():
+        # Check if game over. Note the new head has not been added to the occupancy grid yet, and the tail is still
+        # there
+        if x > self.w - BLOCK_SIZE or x < 0 or y > self.h - BLOCK_SIZE or y < 0:
             self.game_over = True
-            return
+            self.death_cause = "wall"
+            return DEATH_REWARD
+        cell = (int(y) // BLOCK_SIZE) * self.cols + int(x) // BLOCK_SIZE
+        if self._occupancy[cell]:
+            self.game_over = True
+            self.death_cause = "body"
+            return DEATH_REWARD
+        self._occupy(cell)
 
         # Place new food item if at food tile
         if self.head == self.food:
             self.score += 1
             self._place_food()
             self.turns_since_last_ate = 0
+            reward = FOOD_REWARD
         # if snake didn't eat a food item, need to call pop so size maintained
         else:
-            self.snake.pop()
+            tail = self.snake.pop()
+            self._vacate((int(tail.y) // BLOCK_SIZE) * self.cols + int(tail.x) // BLOCK_SIZE)
             self.turns_since_last_ate += 1
+            reward = HUNGRY_REWARD if hungry else STEP_REWARD
 
-        # 5. update ui and clock
-        self._update_ui()
-        self.clock.tick(self.speed)
-
-    def _is_collision(self):
-        # hits boundary
-        if self.head.x > self.w - BLOCK_SIZE or self.head.x < 0 or self.head.y > self.h - BLOCK_SIZE or self.head.y < 0:
-            return True
-        # hits itself
-        if self.head in self.snake[1:]:
-            return True
-        return False
+        # notify observers (e.g. update ui and clock)
+        for observer in self.observers:
+            observer.update(self)
+        return reward
 
     # An obstacle is either a block making up the snake body or a boundary
     def _is_obstacle(self, x_pos, y_pos):
@@ -210,38 +391,196 @@ class SnakeGame:
             return True
 
         # Check if position occupied by a snake body part
-        for point in self.snake:
-            if (x_pos == point.x) and (y_pos == point.y):
-                return True
+        return self._occupancy[self._cell(x_pos, y_pos)] == 1
+
+
+# The same game on a cols x rows grid, with positions stored as cell indices (row * cols + col) instead of pixels:
+# snake is a deque of cells, head is a cell (-1 after a collision with a wall), food is a cell (None once the board
+# is full) and direction is an action int (index into ACTIONS). Board size has nothing to do with any display - a
+# renderer scales cells to pixels itself (see GameRenderer). Moves are looked up in a neighbour table, so a step does
+# no pixel arithmetic and allocates no points, which makes boards of 200 x 200 cells and more practical.
+# With the same seed (and a board of the same number of cells) food is placed exactly as in SnakeGame, so both play
+# the same game for the same moves, with the same state codes (terminal states included). food_sequence is a list of
+# cells
+class GridSnakeGame(SnakeGame):
+
+    def __init__(self, cols=32, rows=24, seed=None, food_sequence=None):
+        self.cols = cols
+        self.rows = rows
+        self.rng = random.Random(seed)
+        self._food_sequence = food_sequence
+        self._food_sequence_index = 0
+        self.observers = []
+        self._neighbours = neighbour_table(cols, rows)
+
+        self._occupancy = bytearray(cols * rows)
+        self._free_cells = list(range(cols * rows))
+        self._free_cell_positions = list(range(cols * rows))
+
+        self.direction = 0
+        self.head = (rows // 2) * cols + cols // 2
+        self.snake = deque([self.head, self.head - 1, self.head - 2])
+        for cell in self.snake:
+            self._occupy(cell)
 
-        return False
+        self.game_over = False
+        self.death_cause = None
+        # (col, row) the head moved to when it hit a wall
+        self._off_board_head = None
 
-    def _update_ui(self):
-        self.display.fill(BLACK)
+        self.score = 0
+        self.food = None
+        self._place_food()
+        self.turns_since_last_ate = 0
+        self.steps = 0
+
+    # The current state, encoded as an int (see STATE_FEATURES)
+    def get_state_code(self):
+        code = MOVING_BITS[self.direction]
+        head = self.head
+        # Only the terminal state after a collision with a wall
+        if head < 0:
+            return self._off_board_state_code()
+
+        neighbours = self._neighbours
+        occupancy = self._occupancy
+        base = head*NUM_ACTIONS
+        for action in range(NUM_ACTIONS):
+            cell = neighbours[base + action]
+            if cell < 0 or occupancy[cell]:
+                code |= DANGER_BITS[action]
+
+        if self.food is not None:
+            col_difference = self.food % self.cols - head % self.cols
+            row_difference = self.food // self.cols - head // self.cols
+            if col_difference > 0:
+                code |= FOOD_BITS[0]
+            if col_difference < 0:
+                code |= FOOD_BITS[1]
+            if row_difference < 0:
+                code |= FOOD_BITS[2]
+            if row_difference > 0:
+                code |= FOOD_BITS[3]
+            if abs(col_difference) + abs(row_difference) == 1:
+                code |= FOOD_ADJACENT_BIT
 
-        for pt in self.snake:
-            pygame.draw.rect(self.display, BLUE1, pygame.Rect(pt.x, pt.y, BLOCK_SIZE, BLOCK_SIZE))
-            pygame.draw.rect(self.display, BLUE2, pygame.Rect(pt.x+4, pt.y+4, 12, 12))
+        if self.turns_since_last_ate > 50:
+            code |= HUNGRY_BIT
+
+        return code
+
+    # State code of the terminal state after a collision with a wall, exactly as SnakeGame gives it: features are
+    # those of the off-board (col, row) the head moved to, where every neighbour off the board is dangerous
+    def _off_board_state_code(self):
+        col, row = self._off_board_head
+        code = MOVING_BITS[self.direction]
+        for action in range(NUM_ACTIONS):
+            delta_x, delta_y = DIRECTION_DELTAS[action]
+            if self._is_obstacle(col + delta_x // BLOCK_SIZE, row + delta_y // BLOCK_SIZE):
+                code |= DANGER_BITS[action]
+
+        if self.food is not None:
+            col_difference = self.food % self.cols - col
+            row_difference = self.food // self.cols - row
+            if col_difference > 0:
+                code |= FOOD_BITS[0]
+            if col_difference < 0:
+                code |= FOOD_BITS[1]
+            if row_difference < 0:
+                code |= FOOD_BITS[2]
+            if row_difference > 0:
+                code |= FOOD_BITS[3]
+            if abs(col_difference) + abs(row_difference) == 1:
+                code |= FOOD_ADJACENT_BIT
 
-        pygame.draw.rect(self.display, RED, pygame.Rect(self.food.x, self.food.y, BLOCK_SIZE, BLOCK_SIZE))
+        if self.turns_since_last_ate > 50:
+            code |= HUNGRY_BIT
 
-        text = self.font.render("Score: " + str(self.score), True, WHITE)
-        self.display.blit(text, [0, 0])
-        pygame.display.flip()
+        return code
 
-    # Move snake using the current direction
-    def _move(self):
-        x = self.head.x
-        y = self.head.y
-        if self.direction == Direction.RIGHT:
-            x += BLOCK_SIZE
-        elif self.direction == Direction.LEFT:
-            x -= BLOCK_SIZE
-        elif self.direction == Direction.DOWN:
-            y += BLOCK_SIZE
-        elif self.direction == Direction.UP:
-            y -= BLOCK_SIZE
+    def head_cell(self):
+        return self.head
 
-        self.head = Point(x, y)
-        self.snake.insert(0, self.head)
+    def tail_cell(self):
+        return self.snake[-1]
+
+    # Positions are cells, so the pixel helpers of SnakeGame take (col, row) here
+    def _cell(self, col, row):
+        return row * self.cols + col
+
+    # An obstacle is either a cell of the snake body or off the board
+    def _is_obstacle(self, col, row):
+        if col < 0 or col >= self.cols or row < 0 or row >= self.rows:
+            return True
+        return self._occupancy[row * self.cols + col] == 1
+
+    # Food is placed uniformly at random on a cell not occupied by the snake (or taken from the food sequence)
+    def _place_food(self):
+        if not self._free_cells:
+            self.food = None
+            self.game_over = True
+            self.death_cause = "board_full"
+            return
+        if self._food_sequence is not None:
+            while self._food_sequence_index < len(self._food_sequence):
+                food = self._food_sequence[self._food_sequence_index]
+                self._food_sequence_index += 1
+                if not self._occupancy[food]:
+                    self.food = food
+                    return
+        self.food = self._free_cells[self.rng.randrange(len(self._free_cells))]
+
+    # Takes an action int (index into ACTIONS), or as for SnakeGame a string or a Direction instance
+    def play_step(self, action):
+
+        if self.game_over:
+            return
+
+        if not isinstance(action, int):
+            if isinstance(action, Direction):
+                action = action.value - 1
+            elif action in ACTIONS:
+                action = ACTIONS.index(action)
+            else:
+                return
+        if not 0 <= action < NUM_ACTIONS:
+            return
+        self._advance(action)
+
+    # Plays the action int and returns its reward (see SnakeGame.step, which works unchanged on this game)
+    def _advance(self, action):
+        hungry = self.turns_since_last_ate > 50
+        self.direction = action
+        head = self._neighbours[self.head*NUM_ACTIONS + action]
+        self.head = head
+        self.steps += 1
+
+        if head < 0:
+            # Kept for the state code of the terminal state
+            delta_x, delta_y = DIRECTION_DELTAS[action]
+            self._off_board_head = (self.snake[0] % self.cols + delta_x // BLOCK_SIZE,
+                                    self.snake[0] // self.cols + delta_y // BLOCK_SIZE)
+            self.game_over = True
+            self.death_cause = "wall"
+            return DEATH_REWARD
+        # Note the tail is still there, as in SnakeGame
+        if self._occupancy[head]:
+            self.game_over = True
+            self.death_cause = "body"
+            return DEATH_REWARD
+        self.snake.appendleft(head)
+        self._occupy(head)
+
+        if head == self.food:
+            self.score += 1
+            self._place_food()
+            self.turns_since_last_ate = 0
+            reward = FOOD_REWARD
+        else:
+            self._vacate(self.snake.pop())
+            self.turns_since_last_ate += 1
+            reward = HUNGRY_REWARD if hungry else STEP_REWARD
 
+        for observer in self.observers:
+            observer.update(self)
+        return reward
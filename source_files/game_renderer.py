@@ -0,0 +1,179 @@
+"""
+Pygame rendering for SnakeGame and GridSnakeGame. A GameRenderer is attached to a game as an observer and is notified
+after every step. It decides when a frame is actually drawn, so the simulation rate is decoupled from the display rate:
+-render_every=k draws every k-th step (and ticks the clock once per drawn frame)
+-fps=f draws at most f frames per second without ever waiting, so the simulation runs ahead at full speed
+Frames after the first only redraw the cells that changed (new head, vacated tail, food, score) and update those
+rectangles of the display, instead of filling and flipping the whole screen.
+
+Segment, food and empty cell sprites are pre-rendered once, the cells of a frame are drawn with a single batched
+blits call, and score text surfaces are cached so text is only rendered the first time a score is shown.
+"""
+
+import time
+
+import pygame
+from game import BLOCK_SIZE, Point, GridSnakeGame
+
+# rgb colors
+WHITE = (255, 255, 255)
+RED = (200,0,0)
+BLUE1 = (0, 0, 255)
+BLUE2 = (0, 100, 255)
+BLACK = (0,0,0)
+
+
+class GameRenderer:
+
+    # If handle_quit is True, closing the window exits the program. Only QUIT events are consumed, so callers
+    # can still read keyboard events themselves
+    # Cells of a GridSnakeGame are drawn block_size pixels wide (so a cols x rows board needs a display of
+    # cols*block_size x rows*block_size). SnakeGame positions are already in pixels, so its games need the default
+    def __init__(self, display, speed=20, handle_quit=True, render_every=1, fps=None, block_size=BLOCK_SIZE):
+        pygame.init()
+        self.font = pygame.font.SysFont('arial', 25)
+        self.display = display
+        pygame.display.set_caption('Snake')
+        self.clock = pygame.time.Clock()
+        self.speed = speed
+        self.handle_quit = handle_quit
+        self.render_every = render_every
+        self.fps = fps
+        self.block_size = block_size
+
+        # The inner square of a segment is inset by a fifth of the block (4 pixels at 20 pixels)
+        inset = block_size // 5
+        self._segment_sprite = pygame.Surface((block_size, block_size)).convert()
+        self._segment_sprite.fill(BLUE1)
+        self._segment_sprite.fill(BLUE2, pygame.Rect(inset, inset, block_size - 2*inset, block_size - 2*inset))
+        self._food_sprite = pygame.Surface((block_size, block_size)).convert()
+        self._food_sprite.fill(RED)
+        self._empty_sprite = pygame.Surface((block_size, block_size)).convert()
+        self._empty_sprite.fill(BLACK)
+        # Score -> rendered score text
+        self._score_texts = {}
+
+        self._updates = 0
+        self._last_frame_time = None
+        # What is currently drawn on the display - the game, its snake cells (positions as the game stores them, i.e.
+        # pixel points or cell indices), food and score
+        self._game = None
+        self._cols = None
+        self._cells = set()
+        self._tail = None
+        self._length = 0
+        self._steps = 0
+        self._food = None
+        self._score = None
+        self._text_rect = None
+
+    def update(self, game):
+        if self.handle_quit and pygame.event.get(pygame.QUIT):
+            pygame.quit()
+            quit()
+
+        self._updates += 1
+        if game is self._game and not self._frame_due():
+            return
+
+        if game is not self._game:
+            self._draw_full(game)
+        else:
+            self._draw_changes(game)
+        self._last_frame_time = time.perf_counter()
+        if self.fps is None:
+            self.clock.tick(self.speed)
+
+    def _frame_due(self):
+        if self.fps is not None:
+            return time.perf_counter() - self._last_frame_time >= 1/self.fps
+        return self._updates % self.render_every == 0
+
+    # Pixel position of a snake cell or food, as the game stores it
+    def _pixels(self, position):
+        if self._cols is None:
+            return position
+        return (position % self._cols)*self.block_size, (position // self._cols)*self.block_size
+
+    # Position, as the game stores it, of the cell at pixel position (x, y)
+    def _position(self, x, y):
+        if self._cols is None:
+            return Point(x, y)
+        # Off the right edge of the board
+        if x // self.block_size >= self._cols:
+            return None
+        return (y // self.block_size)*self._cols + x // self.block_size
+
+    # Draws the whole game and flips the display
+    def _draw_full(self, game):
+        self._cols = game.cols if isinstance(game, GridSnakeGame) else None
+        self.display.fill(BLACK)
+        sprites = [(self._segment_sprite, self._pixels(pt)) for pt in game.snake]
+        if game.food is not None:
+            sprites.append((self._food_sprite, self._pixels(game.food)))
+        self.display.blits(sprites, False)
+        self._draw_score(game.score)
+        pygame.display.flip()
+        self._remember(game, set(game.snake))
+
+    # Redraws only what changed since the previous frame
+    def _draw_changes(self, game):
+        if game.steps == self._steps + 1:
+            # One step since the last frame - the head moved forward and the tail moved unless food was eaten
+            added = [game.snake[0]]
+            removed = [self._tail] if len(game.snake) == self._length else []
+            cells = self._cells
+            cells.add(game.snake[0])
+            cells.difference_update(removed)
+        else:
+            cells = set(game.snake)
+            added = cells - self._cells
+            removed = self._cells - cells
+
+        sprites = [(self._empty_sprite, self._pixels(pt)) for pt in removed]
+        sprites.extend((self._segment_sprite, self._pixels(pt)) for pt in added)
+        if game.food != self._food:
+            if self._food is not None and self._food not in cells:
+                sprites.append((self._empty_sprite, self._pixels(self._food)))
+            if game.food is not None:
+                sprites.append((self._food_sprite, self._pixels(game.food)))
+        dirty = self.display.blits(sprites)
+
+        # The score is drawn over the board, so redraw it if it changed or anything under it was redrawn
+        if game.score != self._score or self._text_rect.collidelist(dirty) != -1:
+            dirty.append(self._text_rect)
+            self.display.fill(BLACK, self._text_rect)
+            self._redraw_cells_in(self._text_rect, cells, game.food)
+            dirty.append(self._draw_score(game.score))
+
+        pygame.display.update(dirty)
+        self._remember(game, cells)
+
+    def _remember(self, game, cells):
+        self._game = game
+        self._cells = cells
+        self._tail = game.snake[-1]
+        self._length = len(game.snake)
+        self._steps = game.steps
+        self._food = game.food
+        self._score = game.score
+
+    def _draw_score(self, score):
+        text = self._score_texts.get(score)
+        if text is None:
+            text = self.font.render("Score: " + str(score), True, WHITE)
+            self._score_texts[score] = text
+        self._text_rect = self.display.blit(text, [0, 0])
+        return self._text_rect
+
+    # Redraws the snake cells and food that overlap rect
+    def _redraw_cells_in(self, rect, cells, food):
+        sprites = []
+        for x in range(rect.left - rect.left % self.block_size, rect.right, self.block_size):
+            for y in range(rect.top - rect.top % self.block_size, rect.bottom, self.block_size):
+                position = self._position(x, y)
+                if position in cells:
+                    sprites.append((self._segment_sprite, (x, y)))
+                if position == food:
+                    sprites.append((self._food_sprite, (x, y)))
+        self.display.blits(sprites, False)
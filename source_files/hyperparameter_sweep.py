@@ -0,0 +1,195 @@
+"""
+Hyperparameter sweeps over the settings of td_qlearning (alpha, gamma, init_q_value, visits_threshold, R_plus).
+
+A search space maps each hyperparameter to either a list of values or, for random search, a (low, high) range
+sampled uniformly ((low, high, "log") for log-uniform). Every configuration is trained headless and evaluated across
+a pool of worker processes, with successive halving: all configurations are trained for min_games games and
+evaluated, only the best 1/eta of them are trained on to eta times as many games, and so on up to max_games. Poor
+configurations are cut off after a few hundred games instead of being trained for the whole run.
+
+Everything a sweep needs to resume lives in its directory:
+-configs.json: the configurations being compared
+-ledger.jsonl: one line per finished job - configuration, games played and evaluation summary (see
+ evaluation.summarize)
+-checkpoints/: the agent of every configuration after its latest finished job (see checkpoint.py)
+Rerunning a sweep in the same directory skips every job already in the ledger.
+"""
+
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+
+from evaluation import summarize
+from game import SnakeGame
+from snake_game_AI_agent import SnakeAgent, SCREEN_WIDTH, SCREEN_HEIGHT
+
+CONFIGS_FILE = "configs.json"
+LEDGER_FILE = "ledger.jsonl"
+CHECKPOINTS_DIR = "checkpoints"
+# Evaluation games are seeded from here on, so they never coincide with training games
+EVALUATION_SEED = 10**9
+
+
+# Every combination of the values listed in space
+def grid_configurations(space):
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+# num_configs configurations sampled from space, where each value is a list to choose from or a (low, high) or
+# (low, high, "log") range
+def random_configurations(space, num_configs, seed=0):
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_configs):
+        config = dict()
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, list):
+                config[name] = rng.choice(values)
+            elif len(values) == 3 and values[2] == "log":
+                config[name] = math.exp(rng.uniform(math.log(values[0]), math.log(values[1])))
+            else:
+                config[name] = rng.uniform(values[0], values[1])
+        configs.append(config)
+    return configs
+
+
+# Games each rung of successive halving trains up to - min_games, eta x min_games, ... and finally max_games
+def rung_budgets(min_games, max_games, eta):
+    budgets = []
+    games = min_games
+    while games < max_games:
+        budgets.append(games)
+        games *= eta
+    budgets.append(max_games)
+    return budgets
+
+
+def _checkpoint_path(sweep_dir, config_id, games):
+    return os.path.join(sweep_dir, CHECKPOINTS_DIR, "config_" + str(config_id) + "_" + str(games) + "_games")
+
+
+# Runs in a worker process - trains the configuration's agent from games_from to games_to games (continuing from its
+# checkpoint), saves it, then evaluates it on eval_games games. Training game i is seeded with base_seed + i, so every
+# configuration trains on the same games
+def _run_job(args):
+    sweep_dir, config_id, config, games_from, games_to, base_seed, eval_games = args
+    if games_from > 0:
+        agent = SnakeAgent.from_checkpoint(_checkpoint_path(sweep_dir, config_id, games_from), mmap_mode=None)
+    else:
+        agent = SnakeAgent(q_backend="array", **config)
+    for game_number in range(games_from, games_to):
+        agent.run_episode(SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, seed=base_seed + game_number))
+    agent.save_checkpoint(_checkpoint_path(sweep_dir, config_id, games_to), games_played=games_to)
+
+    # We no longer want the agent to explore - it is now just performing
+    agent.q_function.visits_threshold = 0
+    scores = []
+    for seed in range(EVALUATION_SEED, EVALUATION_SEED + eval_games):
+        game = SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, seed=seed)
+        agent.run_episode(game, learn=False)
+        scores.append(game.score)
+    record = {"config_id": config_id, "config": config, "games_played": games_to}
+    # summarize also adds "games" - the number of evaluation games
+    record.update(summarize(scores))
+    return record
+
+
+# Runs (or resumes) a sweep in the directory sweep_dir. search is "grid" (every combination of the listed values) or
+# "random" (num_configs sampled configurations). Configurations are compared with successive halving from min_games
+# to max_games games, keeping the best 1/eta at every rung, with eval_games evaluation games per job. Jobs are spread
+# over num_workers processes (defaults to the number of cores). Returns the ranked summary (see ranked_summary)
+def run_sweep(space, sweep_dir, search="grid", num_configs=20, min_games=200, max_games=2000, eta=3, eval_games=100,
+              num_workers=None, seed=0):
+    os.makedirs(os.path.join(sweep_dir, CHECKPOINTS_DIR), exist_ok=True)
+    configs_path = os.path.join(sweep_dir, CONFIGS_FILE)
+    if os.path.isfile(configs_path):
+        file = open(configs_path)
+        configs = json.load(file)
+        file.close()
+    else:
+        if search == "grid":
+            configs = grid_configurations(space)
+        elif search == "random":
+            configs = random_configurations(space, num_configs, seed)
+        else:
+            raise ValueError("search must be \"grid\" or \"random\"")
+        file = open(configs_path, "w")
+        json.dump(configs, file, indent=2)
+        file.close()
+
+    ledger = read_ledger(sweep_dir)
+    budgets = rung_budgets(min_games, max_games, eta)
+    survivors = list(range(len(configs)))
+    with multiprocessing.Pool(num_workers or multiprocessing.cpu_count()) as pool:
+        for rung, games in enumerate(budgets):
+            games_from = budgets[rung - 1] if rung > 0 else 0
+            tasks = [(sweep_dir, config_id, configs[config_id], games_from, games, seed, eval_games)
+                     for config_id in survivors if (config_id, games) not in ledger]
+            file = open(os.path.join(sweep_dir, LEDGER_FILE), "a")
+            for record in pool.imap_unordered(_run_job, tasks):
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                ledger[(record["config_id"], games)] = record
+                print("Config", record["config_id"], "| Games played:", games, "| Mean score:", record["mean"])
+                # The previous checkpoint is no longer needed once this job is in the ledger
+                if games_from > 0:
+                    shutil.rmtree(_checkpoint_path(sweep_dir, record["config_id"], games_from), ignore_errors=True)
+            file.close()
+
+            if rung < len(budgets) - 1:
+                survivors.sort(key=lambda config_id: ledger[(config_id, games)]["mean"], reverse=True)
+                survivors = survivors[:max(1, math.ceil(len(survivors)/eta))]
+
+    summary = ranked_summary(ledger)
+    file = open(os.path.join(sweep_dir, "summary.json"), "w")
+    json.dump(summary, file, indent=2)
+    file.close()
+    return summary
+
+
+# Finished jobs of the sweep in sweep_dir, keyed by (config_id, games_played)
+def read_ledger(sweep_dir):
+    ledger = dict()
+    path = os.path.join(sweep_dir, LEDGER_FILE)
+    if os.path.isfile(path):
+        file = open(path)
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                ledger[(record["config_id"], record["games_played"])] = record
+        file.close()
+    return ledger
+
+
+# The latest result of every configuration, best first - configurations that were trained for more games rank
+# above those cut off earlier, then by mean evaluation score
+def ranked_summary(ledger):
+    latest = dict()
+    for (config_id, games), record in ledger.items():
+        if config_id not in latest or games > latest[config_id]["games_played"]:
+            latest[config_id] = record
+    return sorted(latest.values(), key=lambda record: (record["games_played"], record["mean"]), reverse=True)
+
+
+def print_summary(summary):
+    for rank, record in enumerate(summary, 1):
+        print(str(rank) + ".", "Config", record["config_id"], record["config"],
+              "| Games played:", record["games_played"], "| Mean score:", record["mean"],
+              "| 95% CI: [" + str(round(record["ci_low"], 3)) + ", " + str(round(record["ci_high"], 3)) + "]")
+
+
+if __name__ == '__main__':
+    space = {
+        "alpha": [0.05, 0.1, 0.2, 0.5],
+        "gamma": [0.8, 0.9, 0.95, 0.99],
+        "init_q_value": [0],
+        "visits_threshold": [1, 3, 10],
+        "R_plus": [100, 10000],
+    }
+    print_summary(run_sweep(space, "./agent_data/sweep_1", search="grid", min_games=200, max_games=2000, eta=3))
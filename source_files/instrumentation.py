@@ -0,0 +1,95 @@
+"""
+Opt-in instrumentation for training. A TrainingStats object passed to SnakeAgent.play_game/run_episode records where
+time goes (per phase timing counters), steps/sec, episodes/sec and the size of the Q-table as it grows. Stats can be
+dumped periodically to a JSON-lines file, and a cProfile capture can be taken over a chosen range of episodes.
+
+When no TrainingStats is passed, the training loop only pays for an "is not None" check per phase.
+"""
+
+import cProfile
+import json
+import time
+
+# Phases of the training loop that are timed
+PHASES = ["get_state", "policy", "step", "render", "update", "log"]
+
+
+class TrainingStats:
+
+    # If log_file is given, a JSON line with the current stats is appended to it every log_every episodes.
+    # If profile_episodes = (first, last) is given, episodes first to last (counted from 0, inclusive) are profiled
+    # with cProfile and the profile is written to profile_file
+    def __init__(self, log_file=None, log_every=100, profile_episodes=None, profile_file="training_profile.prof"):
+        self.log_file = log_file
+        self.log_every = log_every
+        self.profile_episodes = profile_episodes
+        self.profile_file = profile_file
+        self._profiler = None
+
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.steps = 0
+        self.episodes = 0
+        self.q_table_size = 0
+        self._q_table_size_at_last_log = 0
+        self.start_time = time.perf_counter()
+        self._last_time = self.start_time
+
+    # Adds the time since the previous lap (or start of the episode) to phase
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phase_seconds[phase] += now - self._last_time
+        self._last_time = now
+
+    def start_episode(self):
+        if self.profile_episodes is not None and self.episodes == self.profile_episodes[0]:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._last_time = time.perf_counter()
+
+    def end_episode(self, game, q_function):
+        self.episodes += 1
+        self.steps += game.steps
+        self.q_table_size = q_function.num_visited_pairs()
+
+        if self._profiler is not None and self.episodes > self.profile_episodes[1]:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_file)
+            self._profiler = None
+        if self.log_file is not None and self.episodes % self.log_every == 0:
+            self.dump()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time
+        timed_seconds = sum(self.phase_seconds.values())
+        return {
+            "episodes": self.episodes,
+            "steps": self.steps,
+            "elapsed_seconds": elapsed,
+            "steps_per_sec": self.steps/elapsed if elapsed > 0 else 0.0,
+            "episodes_per_sec": self.episodes/elapsed if elapsed > 0 else 0.0,
+            "q_table_size": self.q_table_size,
+            # Pairs visited for the first time since the previous dump
+            "q_table_growth": self.q_table_size - self._q_table_size_at_last_log,
+            "phase_seconds": dict(self.phase_seconds),
+            "phase_fractions": {phase: seconds/timed_seconds if timed_seconds > 0 else 0.0
+                                for phase, seconds in self.phase_seconds.items()},
+        }
+
+    def dump(self):
+        file = open(self.log_file, "a")
+        file.write(json.dumps(self.summary()) + "\n")
+        file.close()
+        self._q_table_size_at_last_log = self.q_table_size
+
+
+# Wraps a game observer (e.g. a GameRenderer) so the time spent in it counts as the "render" phase
+class TimedObserver:
+
+    def __init__(self, observer, stats):
+        self.observer = observer
+        self.stats = stats
+
+    def update(self, game):
+        self.stats.lap("step")
+        self.observer.update(game)
+        self.stats.lap("render")
@@ -0,0 +1,103 @@
+"""
+Greedy policies compiled to lookup tables, for evaluation and deployment.
+
+Once an agent stops exploring (visits_threshold = 0), its policy is a fixed function of the state: the action with
+the highest q-value. compile_policy evaluates it once for every state and stores the result in an array with one
+action per state (16384 entries for the basic features), and a LookupPolicy just indexes that array - no q-values,
+visit counts or hyperparameters are needed to play.
+
+A LookupPolicy plays single games (policy, run_episode) and batches of games (policies, e.g. with
+batch_game.BatchSnakeGame and batch_game.state_codes). Saved policies pack 4 actions into each byte, so the policy
+of the basic features is a 4 KB array (plus the .npy header).
+"""
+
+import numpy as np
+
+from features import BasicFeatures
+from game import NUM_ACTIONS, NUM_STATES
+
+# Bits per action in a saved policy, and actions per byte
+ACTION_BITS = 2
+ACTIONS_PER_BYTE = 8 // ACTION_BITS
+
+
+# The greedy policy of q_function (either backend) as a LookupPolicy for num_states states - the action with the
+# highest q-value in every state, ties going to the first action as in td_qlearning.policy. Exploration is ignored,
+# as if visits_threshold were 0. features is the feature set the q-function was learned with (see LookupPolicy)
+def compile_policy(q_function, num_states=NUM_STATES, features=None):
+    if isinstance(q_function.q_values, dict):
+        # Unvisited pairs have the initial q value. Kept as float64 so no two q-values become equal
+        q_values = np.full((num_states, NUM_ACTIONS), q_function.init_q_value, dtype=np.float64)
+        for (state, action), value in q_function.q_values.items():
+            q_values[state, action] = value
+    else:
+        q_values = q_function.q_values
+    return LookupPolicy(np.asarray(q_values).argmax(axis=1).astype(np.uint8), features)
+
+
+class LookupPolicy:
+
+    # actions holds the action int (index into game.ACTIONS) to play in every state. features is the feature set
+    # states are encoded with (see features.py) - None for the basic features, which step() returns directly
+    def __init__(self, actions, features=None):
+        # The basic state code is what step() returns, so it needs no feature set
+        if type(features) is BasicFeatures:
+            features = None
+        num_states = NUM_STATES if features is None else features.num_states
+        if len(actions) != num_states:
+            raise ValueError("Policy has " + str(len(actions)) + " states, but the feature set has " +
+                             str(num_states))
+        self.actions = np.asarray(actions, dtype=np.uint8)
+        self.actions.flags.writeable = False
+        self.features = features
+        # Indexing a list with an int is faster than indexing the array, and gives back a plain int
+        self._action_list = self.actions.tolist()
+
+    def __len__(self):
+        return len(self.actions)
+
+    def policy(self, state):
+        return self._action_list[state]
+
+    # Actions for an array of states, e.g. batch_game.state_codes of every board of a BatchSnakeGame
+    def policies(self, states):
+        return self.actions[states]
+
+    # Plays the game passed in until it ends, like SnakeAgent.run_episode with learn=False - including stopping once
+    # the snake goes more than 100 steps without eating
+    def run_episode(self, game):
+        action_list = self._action_list
+        features = self.features
+        prev_score = game.score
+        turns_passed_since_last_ate = 0
+        state = game.get_state_code() if features is None else features.state_code(game)
+        while not game.game_over:
+            if prev_score == game.score:
+                turns_passed_since_last_ate += 1
+            else:
+                prev_score = game.score
+                turns_passed_since_last_ate = 0
+            if turns_passed_since_last_ate > 100:
+                break
+            if features is None:
+                state = game.step(action_list[state])[0]
+            else:
+                game.step(action_list[state])
+                state = features.state_code(game)
+
+    # Saves the policy to path as a .npy file of packed actions (see ACTION_BITS)
+    def save(self, path):
+        grouped = self.actions.reshape(-1, ACTIONS_PER_BYTE)
+        packed = np.zeros(len(grouped), dtype=np.uint8)
+        for i in range(ACTIONS_PER_BYTE):
+            packed |= grouped[:, i] << (ACTION_BITS*i)
+        np.save(path, packed)
+
+    # Policy saved by save. features must be the feature set it was compiled for (by default the basic features)
+    @staticmethod
+    def load(path, features=None):
+        packed = np.load(path)
+        actions = np.empty((len(packed), ACTIONS_PER_BYTE), dtype=np.uint8)
+        for i in range(ACTIONS_PER_BYTE):
+            actions[:, i] = (packed >> (ACTION_BITS*i)) & ((1 << ACTION_BITS) - 1)
+        return LookupPolicy(actions.reshape(-1), features)
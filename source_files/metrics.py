@@ -0,0 +1,250 @@
+"""
+Streaming training metrics. A MetricsLog passed to SnakeAgent.play_game/run_episode (or learn) appends one record
+per episode to a file, so learning curves come straight from training instead of replaying checkpoints:
+-episode, score, steps and death_cause
+-explored_steps: steps where the action taken had been tried fewer than visits_threshold times in that state (so its
+ value was the exploration value R_plus), and exploration_rate = explored_steps/steps
+-new_pairs: (state, action) pairs visited for the first time during the episode, and visited_pairs in total
+-episode_seconds, and wall_time (seconds since the epoch) at the end of the episode
+
+Records are JSON lines, or CSV if the file name ends in .csv. They are buffered and written in one go every
+flush_every records or flush_seconds seconds, so logging costs next to nothing per episode.
+
+MetricsReader reads a log incrementally (only records appended since the previous read), and RollingMetrics keeps
+statistics over the last window episodes. Both are used by the command line:
+
+    python metrics.py summary training_metrics.jsonl --window 100
+    python metrics.py plot training_metrics.jsonl --window 100 --follow
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import time
+
+FIELDS = ["episode", "score", "steps", "death_cause", "explored_steps", "exploration_rate", "new_pairs",
+          "visited_pairs", "episode_seconds", "wall_time"]
+
+
+def _is_csv(path):
+    return path.endswith(".csv")
+
+
+class MetricsLog:
+
+    # Records are appended to path, numbering episodes from first_episode (e.g. to continue the log of a pretrained
+    # agent). Buffered records are written every flush_every records or flush_seconds seconds, and by close
+    def __init__(self, path, flush_every=100, flush_seconds=5.0, first_episode=1):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.episode = first_episode - 1
+        self._buffer = []
+        self._last_flush = time.perf_counter()
+        self._episode_start = None
+        self._visited_pairs = 0
+
+    def start_episode(self, q_function):
+        self._episode_start = time.perf_counter()
+        self._visited_pairs = q_function.num_visited_pairs()
+
+    # explored_steps is the number of steps of the episode that explored (see above)
+    def end_episode(self, game, q_function, explored_steps):
+        now = time.perf_counter()
+        self.episode += 1
+        visited_pairs = q_function.num_visited_pairs()
+        self._buffer.append({
+            "episode": self.episode,
+            "score": game.score,
+            "steps": game.steps,
+            # A game that is not over was stopped because the snake went too long without eating
+            "death_cause": game.death_cause if game.game_over else "starved",
+            "explored_steps": explored_steps,
+            "exploration_rate": explored_steps/game.steps if game.steps > 0 else 0.0,
+            "new_pairs": visited_pairs - self._visited_pairs,
+            "visited_pairs": visited_pairs,
+            "episode_seconds": now - self._episode_start,
+            "wall_time": time.time(),
+        })
+        if len(self._buffer) >= self.flush_every or now - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.perf_counter()
+        if not self._buffer:
+            return
+        if _is_csv(self.path):
+            write_header = not os.path.isfile(self.path) or os.path.getsize(self.path) == 0
+            file = open(self.path, "a", newline="")
+            writer = csv.DictWriter(file, FIELDS)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(self._buffer)
+        else:
+            file = open(self.path, "a")
+            file.write("".join(json.dumps(record) + "\n" for record in self._buffer))
+        file.close()
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+
+# CSV values are read back as ints or floats where they look like numbers
+def _parse_csv_value(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+class MetricsReader:
+
+    def __init__(self, path):
+        self.path = path
+        # Where the next read starts, and the CSV header once it has been read
+        self._offset = 0
+        self._fields = None
+
+    # Records appended to the log since the previous call (all records on the first call). A line still being
+    # written (not yet ending with a newline) is left for the next call
+    def read_new(self):
+        if not os.path.isfile(self.path):
+            return []
+        file = open(self.path, "rb")
+        file.seek(self._offset)
+        data = file.read()
+        file.close()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+
+        lines = complete.decode().splitlines()
+        if not _is_csv(self.path):
+            return [json.loads(line) for line in lines if line.strip()]
+        rows = list(csv.reader(io.StringIO("\n".join(lines))))
+        if self._fields is None and rows:
+            self._fields = rows.pop(0)
+        return [{field: _parse_csv_value(value) for field, value in zip(self._fields, row)} for row in rows if row]
+
+
+class RollingMetrics:
+
+    # Statistics over the last window records added. Sums are kept as records come and go, so adding a record and
+    # getting the summary take constant time
+    def __init__(self, window=100):
+        self.window = window
+        self.records = collections.deque()
+        self.episodes = 0
+        self._sums = {"score": 0, "steps": 0, "explored_steps": 0, "new_pairs": 0}
+
+    def add(self, record):
+        self.records.append(record)
+        self.episodes = record["episode"]
+        for name in self._sums:
+            self._sums[name] += record[name]
+        if len(self.records) > self.window:
+            oldest = self.records.popleft()
+            for name in self._sums:
+                self._sums[name] -= oldest[name]
+
+    def summary(self):
+        count = len(self.records)
+        if count == 0:
+            return {"episodes": self.episodes, "window": 0}
+        return {
+            "episodes": self.episodes,
+            "window": count,
+            "mean_score": self._sums["score"]/count,
+            "max_score": max(record["score"] for record in self.records),
+            "mean_steps": self._sums["steps"]/count,
+            "exploration_rate": self._sums["explored_steps"]/self._sums["steps"] if self._sums["steps"] > 0 else 0.0,
+            "new_pairs": self._sums["new_pairs"],
+        }
+
+
+# Prints the rolling summary at the end of the log
+def print_summary(path, window):
+    rolling = RollingMetrics(window)
+    for record in MetricsReader(path).read_new():
+        rolling.add(record)
+    summary = rolling.summary()
+    if summary["window"] == 0:
+        print("No episodes logged yet")
+        return
+    print("Episodes:", summary["episodes"], "| Last", summary["window"], "episodes - Mean score:",
+          round(summary["mean_score"], 3), "| Max score:", summary["max_score"], "| Mean steps:",
+          round(summary["mean_steps"], 1), "| Exploration rate:", round(summary["exploration_rate"], 4),
+          "| New pairs:", summary["new_pairs"])
+
+
+# Plots score and exploration rate per episode, with their rolling means over window episodes. With follow, keeps
+# reading records as they are appended and redraws every interval seconds until the window is closed. With output,
+# the plot is saved there instead of shown
+def plot(path, window, follow=False, interval=2.0, output=None):
+    # Imported here so that training never requires matplotlib
+    import matplotlib.pyplot as plt
+
+    reader = MetricsReader(path)
+    rolling = RollingMetrics(window)
+    episodes, scores, mean_scores, exploration_rates = [], [], [], []
+
+    figure, (score_axes, exploration_axes) = plt.subplots(2, 1, sharex=True)
+    score_axes.set_ylabel("Score")
+    exploration_axes.set_ylabel("Exploration Rate")
+    exploration_axes.set_xlabel("Episode")
+    score_line, = score_axes.plot([], [], alpha=0.3, label="Score")
+    mean_line, = score_axes.plot([], [], label="Mean of last " + str(window))
+    exploration_line, = exploration_axes.plot([], [], label="Mean of last " + str(window))
+    score_axes.legend(loc="upper left")
+    score_axes.set_title(os.path.basename(path))
+
+    while True:
+        for record in reader.read_new():
+            rolling.add(record)
+            summary = rolling.summary()
+            episodes.append(record["episode"])
+            scores.append(record["score"])
+            mean_scores.append(summary["mean_score"])
+            exploration_rates.append(summary["exploration_rate"])
+        score_line.set_data(episodes, scores)
+        mean_line.set_data(episodes, mean_scores)
+        exploration_line.set_data(episodes, exploration_rates)
+        for axes in (score_axes, exploration_axes):
+            axes.relim()
+            axes.autoscale_view()
+
+        if not follow:
+            break
+        plt.pause(interval)
+        if not plt.fignum_exists(figure.number):
+            return
+
+    if output is not None:
+        figure.savefig(output)
+    else:
+        plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or plot a training metrics log")
+    parser.add_argument("command", choices=["summary", "plot"])
+    parser.add_argument("log", help="metrics log written by MetricsLog (.jsonl or .csv)")
+    parser.add_argument("--window", type=int, default=100, help="episodes in the rolling window")
+    parser.add_argument("--follow", action="store_true", help="keep plotting records as they are appended")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between redraws with --follow")
+    parser.add_argument("--output", help="save the plot to this file instead of showing it")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        print_summary(args.log, args.window)
+    else:
+        plot(args.log, args.window, follow=args.follow, interval=args.interval, output=args.output)
+
+
+if __name__ == '__main__':
+    main()
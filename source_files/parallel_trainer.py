@@ -0,0 +1,105 @@
+"""
+Trains a SnakeAgent with games spread over a pool of worker processes.
+
+Every round, each worker gets a copy of the current q-function and plays sync_every headless games with it,
+learning as it goes. The results are then merged back into the master q-function, using one of two policies:
+-"replay": workers send back their trials, which are replayed through the master q-function in order
+-"average": workers send back their learned q-function, and the master takes the visit-weighted average
+ (see td_qlearning.merge_visit_weighted)
+"""
+
+import multiprocessing
+import random
+
+import numpy as np
+from game import SnakeGame
+from snake_game_AI_agent import SnakeAgent, SCREEN_WIDTH, SCREEN_HEIGHT, trial_to_arrays
+
+MERGE_POLICIES = ["replay", "average"]
+
+
+# Runs in a worker process - plays num_games with (a copy of) q_function and the agent's feature set, learning from
+# each game. The seed of every game is drawn from seed. Returns the scores along with the trials as concatenated
+# update_batch arrays ("replay") or the learned q-function ("average")
+def _play_games(args):
+    q_function, features, num_games, merge_policy, online, seed = args
+    rng = random.Random(seed)
+    agent = SnakeAgent(features=features)
+    agent.q_function = q_function
+    scores = []
+    trials = []
+    for _ in range(num_games):
+        game = SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, seed=rng.randrange(2**32))
+        trial = agent.run_episode(game, online=online, keep_trial=(merge_policy == "replay"))
+        scores.append(game.score)
+        if merge_policy == "replay":
+            trials.append(trial_to_arrays(trial))
+
+    if merge_policy == "replay":
+        transitions = tuple(np.concatenate(arrays) for arrays in zip(*trials))
+        return scores, transitions
+    return scores, agent.q_function
+
+
+class ParallelTrainer:
+
+    # num_workers defaults to the number of cores. Each round, every worker plays sync_every games before the
+    # results are merged into agent's q-function using merge_policy (see MERGE_POLICIES). The seeds of all games
+    # played are drawn from seed, so training with the same seed and settings is reproducible
+    def __init__(self, agent, num_workers=None, sync_every=10, merge_policy="replay", online=False, seed=None):
+        if merge_policy not in MERGE_POLICIES:
+            raise ValueError("merge_policy must be one of " + str(MERGE_POLICIES))
+        self.agent = agent
+        self.rng = random.Random(seed)
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.sync_every = sync_every
+        self.merge_policy = merge_policy
+        self.online = online
+
+    # Plays num_games games across the workers, merging after every round. on_round, if given, is called as
+    # on_round(games_played, round_scores) once each round has been merged (e.g. to save checkpoints).
+    # Returns the scores of all games played
+    def train(self, num_games, on_round=None):
+        scores = []
+        with multiprocessing.Pool(self.num_workers) as pool:
+            while len(scores) < num_games:
+                round_scores = self._play_round(pool, num_games - len(scores))
+                scores.extend(round_scores)
+                if on_round is not None:
+                    on_round(len(scores), round_scores)
+        return scores
+
+    def _play_round(self, pool, games_left):
+        # Spread the games of this round as evenly as possible over the workers
+        round_games = min(games_left, self.num_workers*self.sync_every)
+        games_per_worker = [round_games//self.num_workers + (1 if i < round_games % self.num_workers else 0)
+                            for i in range(self.num_workers)]
+        tasks = [(self.agent.q_function, self.agent.features, num_games, self.merge_policy, self.online,
+                  self.rng.randrange(2**32)) for num_games in games_per_worker if num_games > 0]
+        results = pool.map(_play_games, tasks)
+
+        round_scores = []
+        for worker_scores, _ in results:
+            round_scores.extend(worker_scores)
+        if self.merge_policy == "replay":
+            for _, transitions in results:
+                self.agent.q_function.update_batch(*transitions)
+        else:
+            self.agent.q_function.merge_visit_weighted([q_function for _, q_function in results])
+        return round_scores
+
+
+if __name__ == '__main__':
+    num_games = 2000
+    # Specify when to save agent in terms of total games played in its life
+    save_every = 50
+    trainer = ParallelTrainer(SnakeAgent(q_backend="array"), sync_every=10, merge_policy="replay")
+
+    def on_round(games_played, round_scores):
+        print("Games played:", games_played, "| Average score:", sum(round_scores)/len(round_scores))
+        # Save agent if a checkpoint was passed during this round
+        if games_played // save_every > (games_played - len(round_scores)) // save_every:
+            trainer.agent.save_checkpoint("./agent_data/set_3/agent_" + str(games_played) + "_games.ckpt",
+                                          games_played=games_played)
+
+    trainer.train(num_games, on_round=on_round)
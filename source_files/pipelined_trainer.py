@@ -0,0 +1,137 @@
+"""
+Trains a SnakeAgent with simulation, learning and I/O split into stages on separate threads:
+-a producer thread plays headless games with the current policy and puts their trials on a bounded queue
+-the learner (the calling thread) takes trials off the queue in order and updates the q-function with them
+-a writer thread does everything that touches disk or stdout - progress output, per game results and checkpoints
+
+The stages are threads of one process, so only one of them runs Python code at a time (the GIL) - simulation and
+learning take turns on one core rather than running in parallel. What overlaps is I/O: the writer's disk and terminal
+output happen while the producer and learner keep working. For CPU parallelism, see parallel_trainer.py, which plays
+games in worker processes.
+
+The producer only ever waits for the learner (when queue_size trials are already waiting), never for the writer, so
+a slow disk or terminal does not stall simulation. Games are played with a policy that is at most queue_size games
+behind the q-function, so unlike SnakeAgent.learn the exact policy each game is played with depends on timing. Early
+in training, when most games are spent exploring, a larger queue_size makes more games repeat the same exploration
+before the learner catches up, so keep it small.
+"""
+
+import json
+import queue
+import random
+import threading
+
+import numpy as np
+from game import SnakeGame
+from snake_game_AI_agent import SnakeAgent, SCREEN_WIDTH, SCREEN_HEIGHT, trial_to_arrays
+from checkpoint_log import CheckpointLog
+
+
+class PipelinedTrainer:
+
+    # Up to queue_size played games wait for the learner. The seeds of all games played are drawn from seed
+    def __init__(self, agent, queue_size=2, seed=None):
+        self.agent = agent
+        self.queue_size = queue_size
+        self.rng = random.Random(seed)
+
+    # Plays and learns from num_games games. Every checkpoint_every games, on_checkpoint is called on the writer
+    # thread as on_checkpoint(q_values, number_of_visits, hyperparameters, games_played) with a copy of the
+    # q-function (see SnakeAgent.checkpoint_data), so CheckpointLog.append can be passed directly.
+    # If results_file is given, a JSON line with the game number, score and steps of every game is appended to it.
+    # If verbose is True the score of every game is printed. Returns the scores of all games played
+    def train(self, num_games, checkpoint_every=None, on_checkpoint=None, results_file=None, verbose=True):
+        trials = queue.Queue(self.queue_size)
+        writes = queue.Queue()
+        stop = threading.Event()
+        errors = []
+        producer = threading.Thread(target=self._produce, args=(num_games, trials, stop, errors), daemon=True)
+        writer = threading.Thread(target=self._write, args=(writes, results_file, errors), daemon=True)
+        producer.start()
+        writer.start()
+
+        scores = []
+        try:
+            while len(scores) < num_games:
+                item = trials.get()
+                # None means the producer failed
+                if item is None:
+                    break
+                score, steps, transitions = item
+                self.agent.q_function.update_batch(*transitions)
+                scores.append(score)
+                games_played = len(scores)
+
+                writes.put((self._record, (games_played, score, steps, verbose)))
+                if checkpoint_every is not None and games_played % checkpoint_every == 0:
+                    q_values, number_of_visits, hyperparameters = self.agent.checkpoint_data()
+                    # Copied, as the learner keeps updating the arrays while the writer saves them
+                    writes.put((on_checkpoint, (np.array(q_values), np.array(number_of_visits), hyperparameters,
+                                                games_played)))
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting for room on the queue
+            while producer.is_alive():
+                try:
+                    trials.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            writes.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+        return scores
+
+    # Producer thread - plays games until num_games have been played or stop is set
+    def _produce(self, num_games, trials, stop, errors):
+        try:
+            for _ in range(num_games):
+                game = SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, seed=self.rng.randrange(2**32))
+                trial = self.agent.run_episode(game, learn=False, keep_trial=True)
+                item = (game.score, game.steps, trial_to_arrays(trial))
+                while not stop.is_set():
+                    try:
+                        trials.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        except Exception as error:
+            errors.append(error)
+            trials.put(None)
+
+    # Writer thread - runs (function, args) items in order until it gets None. After an error, the remaining items
+    # are skipped
+    def _write(self, writes, results_file, errors):
+        self._results = open(results_file, "a") if results_file is not None else None
+        while True:
+            item = writes.get()
+            if item is None:
+                break
+            if errors:
+                continue
+            function, args = item
+            try:
+                function(*args)
+            except Exception as error:
+                errors.append(error)
+        if self._results is not None:
+            self._results.close()
+
+    def _record(self, games_played, score, steps, verbose):
+        if self._results is not None:
+            self._results.write(json.dumps({"game": games_played, "score": score, "steps": steps}) + "\n")
+        if verbose:
+            print("Game:", games_played, "| Score:", score)
+
+
+if __name__ == '__main__':
+    num_games = 2000
+    # Specify when to save agent in terms of total games played in its life
+    save_every = 50
+    checkpoint_log = CheckpointLog("./agent_data/set_3/checkpoint_log", full_every=10)
+    trainer = PipelinedTrainer(SnakeAgent(q_backend="array"))
+    trainer.train(num_games, checkpoint_every=save_every, on_checkpoint=checkpoint_log.append,
+                  results_file="./agent_data/set_3/training_results.jsonl")
@@ -0,0 +1,97 @@
+"""
+Reachable area analysis on a SnakeGame board, and a policy wrapper that uses it to avoid trapping the snake.
+
+ReachabilityAnalyser flood fills the free cells of the game's occupancy grid from each cell next to the head. The
+grid is read as a bitboard (one int), so a fill grows a whole region by one step in every direction with a handful
+of int operations, instead of visiting cells one at a time. Fills are bounded - they stop as soon as they have found
+as many cells as asked for (normally the snake's length). The masks a fill needs are precomputed per board size,
+and neighbours of the head that turn out to be in the same region share one fill.
+
+SafePolicy picks the best action of a q-function like its policy does, but vetoes moves into regions with fewer free
+cells than the snake is long, unless every move is vetoed.
+"""
+
+from game import NUM_ACTIONS, neighbour_table
+
+# (cols, rows) -> bitboard masks of that board size, built on first use
+_bitboard_masks = dict()
+
+
+# Masks for bitboards of a cols x rows board, where cell c is bit 8*c (so a bitboard of the occupancy grid is simply
+# its bytes read as one int). Returns (all cells, cells with a right neighbour, cells with a left neighbour)
+def bitboard_masks(cols, rows):
+    if (cols, rows) not in _bitboard_masks:
+        cells = range(cols*rows)
+        _bitboard_masks[(cols, rows)] = (int.from_bytes(bytes([1])*(cols*rows), "little"),
+                                         int.from_bytes(bytes(int(c % cols < cols - 1) for c in cells), "little"),
+                                         int.from_bytes(bytes(int(c % cols > 0) for c in cells), "little"))
+    return _bitboard_masks[(cols, rows)]
+
+
+class ReachabilityAnalyser:
+
+    # For every action, the number of free cells reachable by moving in that direction from the head (0 if the move
+    # is into a wall or the snake). Counting stops at limit, which defaults to the snake's length, so sizes are at
+    # most limit. Returns None if the head is off the board (after a collision with a wall)
+    def region_sizes(self, game, limit=None):
+        head = game.head_cell()
+        if head < 0:
+            return None
+        if limit is None:
+            limit = len(game.snake)
+        neighbours = neighbour_table(game.cols, game.rows)
+        occupancy = game._occupancy
+        all_cells, has_right, has_left = bitboard_masks(game.cols, game.rows)
+        free = all_cells ^ int.from_bytes(occupancy, "little")
+        row_shift = 8*game.cols
+
+        sizes = [0]*NUM_ACTIONS
+        # Regions filled so far, with their sizes. Neighbours of the head in the same region share one fill
+        regions = []
+        for action in range(NUM_ACTIONS):
+            cell = neighbours[head*NUM_ACTIONS + action]
+            if cell < 0 or occupancy[cell]:
+                continue
+            start = 1 << 8*cell
+            for region, size in regions:
+                if region & start:
+                    sizes[action] = size
+                    break
+            else:
+                # Grow the region by one step in every direction at once, until it stops growing or is big enough
+                region = start
+                size = 1
+                while size < limit:
+                    grown = (region | (region & has_right) << 8 | (region & has_left) >> 8 | region << row_shift |
+                             region >> row_shift) & free
+                    if grown == region:
+                        break
+                    region = grown
+                    size = region.bit_count()
+                sizes[action] = min(size, limit)
+                regions.append((region, sizes[action]))
+        return sizes
+
+
+class SafePolicy:
+
+    def __init__(self, analyser=None):
+        self.analyser = analyser if analyser is not None else ReachabilityAnalyser()
+
+    # The action with the highest value (see td_qlearning.action_values) among the moves that lead into a region
+    # with at least as many free cells as the snake is long. If there are none, the action into the largest region
+    # is taken, and if every move is into a wall or the snake, q_function's own choice
+    def policy(self, q_function, state, game):
+        sizes = self.analyser.region_sizes(game)
+        if sizes is None or max(sizes) == 0:
+            return q_function.policy(state)
+        length = len(game.snake)
+        if max(sizes) < length:
+            return sizes.index(max(sizes))
+
+        values = q_function.action_values(state)
+        best_action = None
+        for action in range(NUM_ACTIONS):
+            if sizes[action] >= length and (best_action is None or values[action] > values[best_action]):
+                best_action = action
+        return best_action
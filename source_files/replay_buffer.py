@@ -0,0 +1,68 @@
+"""
+Experience replay for SnakeAgent. A ReplayBuffer keeps the most recent transitions (state, action, reward,
+next_state, done) of past games in a ring of preallocated arrays, so memory is fixed by its capacity (about
+capacity x 18 bytes) however many games are played - once full, each new transition overwrites the oldest one.
+
+Minibatches are sampled either uniformly, or (with prioritized=True) in proportion to each transition's last TD
+error to the power priority_exponent, so transitions the q-function predicts badly are replayed more often. New
+transitions get the highest priority seen so far, so each is likely to be replayed at least once.
+"""
+
+import numpy as np
+
+
+class ReplayBuffer:
+
+    def __init__(self, capacity, prioritized=False, priority_exponent=0.6, seed=None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.priority_exponent = priority_exponent
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float32)
+        self._max_priority = 1.0
+
+        # Index the next transition is written to, and the number of transitions stored
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # Adds transitions given as arrays (see trial_to_arrays), overwriting the oldest ones once the buffer is full
+    def add(self, states, actions, rewards, next_states, dones):
+        count = len(states)
+        # Only the last capacity transitions would survive anyway
+        start = max(0, count - self.capacity)
+        indices = (self.position + np.arange(count - start)) % self.capacity
+        self.states[indices] = states[start:]
+        self.actions[indices] = actions[start:]
+        self.rewards[indices] = rewards[start:]
+        self.next_states[indices] = next_states[start:]
+        self.dones[indices] = dones[start:]
+        self.priorities[indices] = self._max_priority
+        self.position = (self.position + count - start) % self.capacity
+        self.size = min(self.size + count - start, self.capacity)
+
+    # Samples batch_size transitions (with replacement). Returns their indices in the buffer, for update_priorities,
+    # and the transitions as (states, actions, rewards, next_states, dones) arrays
+    def sample(self, batch_size):
+        if self.prioritized:
+            weights = self.priorities[:self.size].astype(np.float64)**self.priority_exponent
+            indices = self.rng.choice(self.size, size=batch_size, p=weights/weights.sum())
+        else:
+            indices = self.rng.integers(0, self.size, size=batch_size)
+        return indices, (self.states[indices], self.actions[indices], self.rewards[indices],
+                         self.next_states[indices], self.dones[indices])
+
+    # Sets the priorities of sampled transitions from their new TD errors (see td_qlearning.td_errors)
+    def update_priorities(self, indices, td_errors):
+        # A small constant keeps transitions with no error from never being sampled again
+        priorities = np.abs(td_errors) + 1e-3
+        self.priorities[indices] = priorities
+        self._max_priority = max(self._max_priority, float(priorities.max()))
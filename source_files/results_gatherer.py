@@ -1,32 +1,26 @@
-import math
-import pickle
 import matplotlib.pyplot as plt
-# import below is implicitly required
-from snake_game_AI_agent import SnakeAgent, td_qlearning
+from evaluation import evaluate
 
-SAMPLE_SIZE = 20
+SAMPLE_SIZE = 1000
+# Every checkpoint plays the same seeded games, with identical food placement for the first FOOD_SEQUENCE_LENGTH foods
+SEED = 0
+FOOD_SEQUENCE_LENGTH = 200
 
 def main():
 
     num_games_checkpoints = list(range(50, 501,50))
-    average_scores = []
+    checkpoints = ["./agent_data/set_2/agent_" + str(num_games) + "_games.pickle" for num_games in num_games_checkpoints]
 
-    for num_games in num_games_checkpoints:
-
-        file = open("./agent_data/set_2/agent_" + str(num_games) + "_games.pickle", "rb")
-        agent = pickle.load(file)
-        file.close()
-        # We no longer want the agent to explore - it is now just performing
-        agent.q_function.visits_threshold = 0
-
-        cur_average_score = 0
-
-        for _ in range(SAMPLE_SIZE):
-            cur_average_score += agent.play_game(learn=False, speed=math.inf)
-        average_scores.append(cur_average_score/SAMPLE_SIZE)
+    # Every game played is also recorded in the results file
+    summaries = evaluate(checkpoints, games_per_checkpoint=SAMPLE_SIZE, results_file="temp_results_games.jsonl",
+                         base_seed=SEED, food_sequence_length=FOOD_SEQUENCE_LENGTH)
+    average_scores = [summaries[checkpoint]["mean"] for checkpoint in checkpoints]
 
     for i in range(len(num_games_checkpoints)):
-        print("Games played:", num_games_checkpoints[i], "| Score: ", average_scores[i])
+        summary = summaries[checkpoints[i]]
+        print("Games played:", num_games_checkpoints[i], "| Score: ", summary["mean"],
+              "| Median:", summary["median"], "| Stdev:", round(summary["stdev"], 3),
+              "| 95% CI: [" + str(round(summary["ci_low"], 3)) + ", " + str(round(summary["ci_high"], 3)) + "]")
 
     plt.plot(num_games_checkpoints, average_scores)
     plt.xlabel("Number of Games Played")
@@ -1,8 +1,16 @@
 import math
 import pickle
 
-import pygame
-from game import SnakeGame, State
+import numpy as np
+from checkpoint import save_checkpoint, load_checkpoint
+from checkpoint_log import CheckpointLog
+from features import BasicFeatures
+from reachability import SafePolicy
+from lookup_policy import compile_policy
+from game import SnakeGame, ACTIONS, NUM_ACTIONS, NUM_STATES, DANGER_BITS, FOOD_BITS, FOOD_ADJACENT_BIT, HUNGRY_BIT, \
+    FOOD_REWARD, DEATH_REWARD, HUNGRY_REWARD, STEP_REWARD, bitstring_to_code
+from instrumentation import TrainingStats, TimedObserver
+from metrics import MetricsLog
 
 SCREEN_WIDTH = 640
 SCREEN_HEIGHT = 480
@@ -10,28 +18,25 @@ SCREEN_HEIGHT = 480
 class td_qlearning():
 
     # Note: To compute reward, both the state and action are required
+    # Note: States are encoded as ints (see game.STATE_FEATURES) and actions as indices into game.ACTIONS
     @staticmethod
-    def reward(state_bitstring, action):
-        state = State(state_bitstring)
+    def reward(state, action):
         # An action of None implies we are at a terminal state. This means a collision occurred. Set reward to -10
         # (Actually, reward of 0 should work also since already punished for collision previously)
         # ** Maybe we don't even need q-value for terminal states? Reflect later -- YUP, REMOVED FOR NOW
         if action is None:
             return -10
         # Check if action resulted in food being obtained
-        elif state.food_adjacent and \
-                ((state.food_left and action == "left") or (state.food_right and action == "right") or
-                 (state.food_up and action == "up") or (state.food_down and action == "down")):
-            return 50
+        elif state & FOOD_ADJACENT_BIT and state & FOOD_BITS[action]:
+            return FOOD_REWARD
         # Check if action resulted in a collision
-        elif (state.danger_left and action == "left") or (state.danger_right and action == "right") or \
-                (state.danger_up and action == "up") or (state.danger_down and action == "down"):
-            return -50
+        elif state & DANGER_BITS[action]:
+            return DEATH_REWARD
         # REMOVE LATER
-        elif state.hungry:
-            return -50
+        elif state & HUNGRY_BIT:
+            return HUNGRY_REWARD
         else:
-            return -1
+            return STEP_REWARD
 
     def __init__(self, alpha, gamma, init_q_value, visits_threshold, R_plus):
         # Stores q value for state action pairs that have been visited (if not visited, q value is the default one)
@@ -43,38 +48,99 @@ class td_qlearning():
         self.visits_threshold = visits_threshold
         self.R_plus = R_plus
 
+    # Agents pickled before states and actions were encoded as ints have (bitstring, action string) keys.
+    # Convert them when unpickling so existing agent_data pickles can still be loaded
+    def __setstate__(self, attributes):
+        self.__dict__.update(attributes)
+        self.q_values = convert_legacy_keys(self.q_values)
+        self.number_of_visits = convert_legacy_keys(self.number_of_visits)
+
     # Update the q-function using the trial passed in. We use the exploitation/exploration method
-    # Note: States are required to be passed in as bitstring representations
+    # Note: States are required to be passed in as int encodings and actions as ints (see reward)
     def update(self, trial):
         # Note: Ignore terminal state since it has no associated action and reward requires both state and action
         for i in range(len(trial) - 1):
             state, action = trial[i]
-            if (state, action) not in self.q_values:
-                self.q_values[(state, action)] = self.init_q_value
-                self.number_of_visits[(state, action)] = 0
-            self.number_of_visits[(state, action)] += 1
-
-            # If next state is the terminal state, q(s,a) is simply reward(s,a)
-            if i + 1 >= len(trial) - 1:
-                self.q_values[(state, action)] = td_qlearning.reward(state, action)
-                continue
-
-            # Otherwise update q_value regularly
-            cur_q_value = self.q_values[(state, action)]
-            estimate_q_value = td_qlearning.reward(state, action)
-
-            # must find the max q value possible from the next state
-            next_state = trial[i + 1][0]
-            max_q_value_in_next_state = -math.inf
-            for possible_action in ["right", "left", "up", "down"]:
-                cur_q_value_in_next_state = self.q_value(next_state, possible_action)
-                if cur_q_value_in_next_state > max_q_value_in_next_state:
-                    max_q_value_in_next_state = cur_q_value_in_next_state
-            # Note: must account for the discount factor here
-            estimate_q_value += self.gamma*max_q_value_in_next_state
-
-            # Update q-value for the current state action pair being examined
-            self.q_values[(state, action)] += self.alpha*(estimate_q_value - cur_q_value)
+            # If next state is the terminal state, there is no next state to estimate from
+            next_state = trial[i + 1][0] if i + 1 < len(trial) - 1 else None
+            self.update_step(state, action, next_state)
+
+    # Update the q-function using transitions given as arrays (e.g. from trial_to_arrays, possibly many trials
+    # concatenated). dones[i] is True if next_states[i] is a terminal state.
+    # The dict backend always applies the transitions one at a time, in order (sequential=True).
+    # With count_visits=False the q-values are updated but visit counts are not, e.g. for transitions replayed from
+    # a replay buffer, which were already counted when they were played - so replays do not end exploration early
+    def update_batch(self, states, actions, next_states, dones, sequential=True, count_visits=True):
+        for state, action, next_state, done in zip(np.asarray(states).tolist(), np.asarray(actions).tolist(),
+                                                   np.asarray(next_states).tolist(), np.asarray(dones).tolist()):
+            self.update_step(state, action, None if done else next_state, count_visits)
+
+    # Update q(state, action) after action was taken in state and led to next_state (None if terminal). The visit is
+    # counted unless count_visit is False (see update_batch)
+    def update_step(self, state, action, next_state, count_visit=True):
+        if (state, action) not in self.q_values:
+            self.q_values[(state, action)] = self.init_q_value
+        if count_visit:
+            self.number_of_visits[(state, action)] = self.number_of_visits.get((state, action), 0) + 1
+
+        # If next state is the terminal state, q(s,a) is simply reward(s,a)
+        if next_state is None:
+            self.q_values[(state, action)] = td_qlearning.reward(state, action)
+            return
+
+        # Otherwise update q_value regularly
+        cur_q_value = self.q_values[(state, action)]
+        estimate_q_value = td_qlearning.reward(state, action)
+
+        # must find the max q value possible from the next state
+        max_q_value_in_next_state = -math.inf
+        for possible_action in range(NUM_ACTIONS):
+            cur_q_value_in_next_state = self.q_value(next_state, possible_action)
+            if cur_q_value_in_next_state > max_q_value_in_next_state:
+                max_q_value_in_next_state = cur_q_value_in_next_state
+        # Note: must account for the discount factor here
+        estimate_q_value += self.gamma*max_q_value_in_next_state
+
+        # Update q-value for the current state action pair being examined
+        self.q_values[(state, action)] += self.alpha*(estimate_q_value - cur_q_value)
+
+    # Merges q-functions that started as copies of this one and then learned separately (e.g. in worker
+    # processes). For every pair, the new q value is the average of this q-function's value and the copies' values,
+    # each weighted by its number of visits (for the copies, only the visits made since they were copied)
+    def merge_visit_weighted(self, q_functions):
+        pairs = set()
+        for q_function in q_functions:
+            pairs.update(q_function.number_of_visits)
+        for pair in pairs:
+            base_visits = self.number_of_visits.get(pair, 0)
+            total_visits = base_visits
+            weighted_q_value = base_visits*self.q_values.get(pair, self.init_q_value)
+            for q_function in q_functions:
+                new_visits = q_function.number_of_visits.get(pair, 0) - base_visits
+                if new_visits > 0:
+                    total_visits += new_visits
+                    weighted_q_value += new_visits*q_function.q_values[pair]
+            if total_visits > base_visits:
+                self.q_values[pair] = weighted_q_value/total_visits
+                self.number_of_visits[pair] = total_visits
+
+    # TD errors of transitions given as arrays (see update_batch, plus their rewards) under the current q-values -
+    # how far each q(state, action) is from its TD target
+    def td_errors(self, states, actions, rewards, next_states, dones):
+        errors = np.zeros(len(states), dtype=np.float32)
+        for i, (state, action, reward, next_state, done) in enumerate(zip(
+                np.asarray(states).tolist(), np.asarray(actions).tolist(), np.asarray(rewards).tolist(),
+                np.asarray(next_states).tolist(), np.asarray(dones).tolist())):
+            target = reward
+            if not done:
+                target += self.gamma*max(self.q_value(next_state, possible_action)
+                                         for possible_action in range(NUM_ACTIONS))
+            errors[i] = target - self.q_value(state, action)
+        return errors
+
+    # Number of (state, action) pairs visited at least once - the size of the Q-table
+    def num_visited_pairs(self):
+        return len(self.number_of_visits)
 
     def q_value(self, state, action):
         if (state, action) not in self.q_values:
@@ -88,11 +154,16 @@ class td_qlearning():
         else:
             return self.number_of_visits[(state,action)]
 
+    # Value of every action in state for the exploration/exploitation function, indexed by action
+    def action_values(self, state):
+        return [self.R_plus if self.num_visits_for_given_pair(state, action) < self.visits_threshold
+                else self.q_value(state, action) for action in range(NUM_ACTIONS)]
+
     def policy(self, state):
         # Policy chooses the action with the value for the exploration/exploitation function
         best_action = None
         highest_value = -math.inf
-        for action in ["right", "left", "up", "down"]:
+        for action in range(NUM_ACTIONS):
             cur_value = None
             if self.num_visits_for_given_pair(state, action) < self.visits_threshold:
                 cur_value = self.R_plus
@@ -105,33 +176,314 @@ class td_qlearning():
         return best_action
 
 
+# Same learning as td_qlearning, but q-values and visit counts are stored in dense arrays indexed by
+# [state, action] instead of dicts. Memory is fixed (num_states x NUM_ACTIONS entries), and whole batches of
+# transitions are handled with vectorized NumPy (update_batch with sequential=False, td_errors).
+# NumPy calls on a single row of NUM_ACTIONS entries cost more than the dict lookups they replace, so the per step
+# methods (policy, update_step, the sequential update_batch, ...) work on plain Python lists instead - a copy of a
+# state's row of q-values and visit counts, made on first use (see _row). Per step updates write to both the row
+# and the arrays, so the two stay in sync. Methods that change the arrays in bulk drop the rows they change
+class td_qlearning_array(td_qlearning):
+
+    def __init__(self, alpha, gamma, init_q_value, visits_threshold, R_plus, num_states=NUM_STATES):
+        super().__init__(alpha, gamma, init_q_value, visits_threshold, R_plus)
+        # Unvisited pairs simply hold the initial q value
+        self.q_values = np.full((num_states, NUM_ACTIONS), init_q_value, dtype=np.float32)
+        self.number_of_visits = np.zeros((num_states, NUM_ACTIONS), dtype=np.int32)
+        self._rows = dict()
+
+    # Copy of a q-function using the dict backend, e.g. to compare the two backends or to convert an old pickle
+    @classmethod
+    def from_q_function(cls, q_function, num_states=NUM_STATES):
+        array_q_function = cls(q_function.alpha, q_function.gamma, q_function.init_q_value,
+                               q_function.visits_threshold, q_function.R_plus, num_states)
+        for (state, action), value in q_function.q_values.items():
+            array_q_function.q_values[state, action] = value
+        for (state, action), visits in q_function.number_of_visits.items():
+            array_q_function.number_of_visits[state, action] = visits
+        return array_q_function
+
+    # q-function using the arrays passed in as they are (not copied), e.g. memory-mapped arrays of a checkpoint
+    @classmethod
+    def from_arrays(cls, q_values, number_of_visits, alpha, gamma, init_q_value, visits_threshold, R_plus):
+        array_q_function = cls.__new__(cls)
+        td_qlearning.__init__(array_q_function, alpha, gamma, init_q_value, visits_threshold, R_plus)
+        array_q_function.q_values = q_values
+        array_q_function.number_of_visits = number_of_visits
+        array_q_function._rows = dict()
+        return array_q_function
+
+    # Rows are only a cache of the arrays, so they are not pickled
+    def __getstate__(self):
+        attributes = self.__dict__.copy()
+        del attributes["_rows"]
+        return attributes
+
+    # Arrays are never legacy keyed, so nothing to convert
+    def __setstate__(self, attributes):
+        self.__dict__.update(attributes)
+        self._rows = dict()
+
+    # (q-values, visit counts) of state as lists indexed by action, kept in sync with the arrays.
+    # setdefault stores a new row in one step, so when two threads miss on the same state at once (the producer and
+    # the learner of pipelined_trainer.py) both use the row stored first, rather than a later store replacing a row
+    # the other thread has already updated
+    def _row(self, state):
+        row = self._rows.get(state)
+        if row is None:
+            row = self._rows.setdefault(state, (self.q_values[state].tolist(), self.number_of_visits[state].tolist()))
+        return row
+
+    def update(self, trial):
+        self.update_batch(*trial_to_arrays(trial))
+
+    # Update the q-function using transitions given as arrays (see td_qlearning.update_batch).
+    # With sequential=True the transitions are applied one at a time in order, exactly like update().
+    # With sequential=False every TD target is computed from the q-values as they were before the call and all
+    # updates are applied at once. Repeated (state, action) pairs then add up their updates rather than each
+    # one seeing the result of the previous one, so results differ slightly from the sequential order.
+    # With count_visits=False visit counts are left unchanged (see td_qlearning.update_batch)
+    def update_batch(self, states, actions, next_states, dones, sequential=True, count_visits=True):
+        states = np.asarray(states, dtype=np.intp)
+        actions = np.asarray(actions, dtype=np.intp)
+        next_states = np.asarray(next_states, dtype=np.intp)
+        dones = np.asarray(dones, dtype=bool)
+        # Rewards only depend on the basic features, which are the low bits of every encoding (see features.py)
+        rewards = reward_table()[states & (NUM_STATES - 1), actions]
+
+        if sequential:
+            for state, action, next_state, done, reward in zip(states.tolist(), actions.tolist(),
+                                                               next_states.tolist(), dones.tolist(),
+                                                               rewards.tolist()):
+                self._update_pair(state, action, None if done else next_state, reward, count_visits)
+            return
+
+        if count_visits:
+            np.add.at(self.number_of_visits, (states, actions), 1)
+        estimates = rewards + self.gamma*self.q_values[next_states].max(axis=1)
+        not_done = ~dones
+        np.add.at(self.q_values, (states[not_done], actions[not_done]),
+                  self.alpha*(estimates[not_done] - self.q_values[states[not_done], actions[not_done]]))
+        # If next state is the terminal state, q(s,a) is simply reward(s,a)
+        self.q_values[states[dones], actions[dones]] = rewards[dones]
+        for state in np.unique(states).tolist():
+            self._rows.pop(state, None)
+
+    def update_step(self, state, action, next_state, count_visit=True):
+        self._update_pair(state, action, next_state, td_qlearning.reward(state, action), count_visit)
+
+    # update_step with the reward already known
+    def _update_pair(self, state, action, next_state, reward, count_visit=True):
+        q_row, visits_row = self._row(state)
+        if count_visit:
+            visits_row[action] += 1
+            self.number_of_visits[state, action] = visits_row[action]
+
+        # If next state is the terminal state, q(s,a) is simply reward(s,a)
+        if next_state is None:
+            self.q_values[state, action] = reward
+        else:
+            estimate_q_value = reward + self.gamma*max(self._row(next_state)[0])
+            self.q_values[state, action] = q_row[action] + self.alpha*(estimate_q_value - q_row[action])
+        # Read back, so the row holds the value as rounded to float32 in the array
+        q_row[action] = self.q_values.item(state, action)
+
+    # See td_qlearning.merge_visit_weighted
+    def merge_visit_weighted(self, q_functions):
+        base_visits = self.number_of_visits.astype(np.float64)
+        total_visits = base_visits.copy()
+        weighted_q_values = base_visits*self.q_values
+        for q_function in q_functions:
+            new_visits = np.maximum(q_function.number_of_visits - self.number_of_visits, 0)
+            total_visits += new_visits
+            weighted_q_values += new_visits*q_function.q_values
+        changed = total_visits > base_visits
+        self.q_values[changed] = weighted_q_values[changed]/total_visits[changed]
+        self.number_of_visits[:] = total_visits
+        self._rows.clear()
+
+    def td_errors(self, states, actions, rewards, next_states, dones):
+        states = np.asarray(states, dtype=np.intp)
+        actions = np.asarray(actions, dtype=np.intp)
+        next_values = self.q_values[np.asarray(next_states, dtype=np.intp)].max(axis=1)
+        targets = np.asarray(rewards) + np.where(dones, 0, self.gamma*next_values)
+        return (targets - self.q_values[states, actions]).astype(np.float32)
+
+    def num_visited_pairs(self):
+        return int(np.count_nonzero(self.number_of_visits))
+
+    def q_value(self, state, action):
+        return self._row(state)[0][action]
+
+    def num_visits_for_given_pair(self, state, action):
+        return self._row(state)[1][action]
+
+    # Pairs visited fewer than visits_threshold times get the exploration value R_plus
+    def action_values(self, state):
+        q_row, visits_row = self._row(state)
+        return [self.R_plus if visits_row[action] < self.visits_threshold else q_row[action]
+                for action in range(NUM_ACTIONS)]
+
+    def policy(self, state):
+        q_row, visits_row = self._row(state)
+        visits_threshold = self.visits_threshold
+        # Ties go to the first action, as in td_qlearning.policy
+        best_action = None
+        highest_value = -math.inf
+        for action in range(NUM_ACTIONS):
+            cur_value = self.R_plus if visits_row[action] < visits_threshold else q_row[action]
+            if cur_value > highest_value:
+                best_action = action
+                highest_value = cur_value
+        return best_action
+
+
+# reward_table()[state, action] is td_qlearning.reward(state, action), for every encoded state and action.
+# Built on first use
+_reward_table = None
+
+
+def reward_table():
+    global _reward_table
+    if _reward_table is None:
+        _reward_table = np.array([[td_qlearning.reward(state, action) for action in range(NUM_ACTIONS)]
+                                  for state in range(NUM_STATES)], dtype=np.float32)
+    return _reward_table
+
+
+# Converts a trial (list of (state, action) pairs ending with the terminal state) into the arrays
+# (states, actions, next_states, dones) taken by update_batch
+def trial_to_arrays(trial):
+    transitions = len(trial) - 1
+    states = np.fromiter((state for state, _ in trial), dtype=np.intp, count=len(trial))
+    actions = np.fromiter((action for _, action in trial[:-1]), dtype=np.intp, count=transitions)
+    dones = np.zeros(transitions, dtype=bool)
+    dones[-1:] = True
+    return states[:-1], actions, states[1:], dones
+
+
+# Q-function classes that SnakeAgent can use, selected with its q_backend argument
+Q_BACKENDS = {"dict": td_qlearning, "array": td_qlearning_array}
+
+
+# Converts a dict keyed by (state bitstring, action string) to one keyed by (state int, action int).
+# Dicts that are already int keyed are returned unchanged
+def convert_legacy_keys(table):
+    if not any(isinstance(state, str) for state, _ in table):
+        return table
+    return {(bitstring_to_code(state), ACTIONS.index(action)): value for (state, action), value in table.items()}
+
+
+# Agents saved by the training script (this module run as __main__) refer to their classes as __main__.SnakeAgent,
+# __main__.td_qlearning, ... Unpickling them from any other script (or a worker process) looks the classes up in
+# this module instead
+class AgentUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if module == "__main__":
+            module = __name__
+        return super().find_class(module, name)
+
+
 class SnakeAgent:
 
-    def __init__(self, alpha=0.1, gamma=0.9, init_q_value=0, visits_threshold=1, R_plus=10000):
+    # A reachability.SafePolicy, if moves into regions too small for the snake are vetoed (see safe_policy below)
+    safe_policy = None
+    # A replay_buffer.ReplayBuffer, if the agent also learns from replayed past transitions (see replay_buffer below)
+    replay_buffer = None
+    replay_ratio = 1.0
+    replay_batch_size = 32
+
+    # q_backend selects how q-values are stored - "dict" (td_qlearning) or "array" (td_qlearning_array)
+    # features selects how game states are encoded (see features.py), BasicFeatures by default. The array backend is
+    # sized for the encoding's number of states
+    # If safe_policy is True, moves into regions with fewer free cells than the snake is long are vetoed when playing
+    # (see reachability.py). The q-function still learns from the moves actually made
+    # If a replay_buffer (see replay_buffer.py) is given, the transitions of every game learned from are added to it,
+    # and after the game replay_ratio x (number of transitions in the game) transitions sampled from it are learned
+    # from again, in minibatches of replay_batch_size. Replays update q-values only - they are not counted as visits,
+    # so they do not cut exploration short
+    def __init__(self, alpha=0.1, gamma=0.9, init_q_value=0, visits_threshold=1, R_plus=10000, q_backend="dict",
+                 features=None, safe_policy=False, replay_buffer=None, replay_ratio=1.0, replay_batch_size=32):
+        self.features = features if features is not None else BasicFeatures()
+        if safe_policy:
+            self.safe_policy = SafePolicy()
+        self.replay_buffer = replay_buffer
+        self.replay_ratio = replay_ratio
+        self.replay_batch_size = replay_batch_size
+        if q_backend == "array":
+            self.q_function = td_qlearning_array(alpha, gamma, init_q_value, visits_threshold, R_plus,
+                                                 num_states=self.features.num_states)
+        else:
+            self.q_function = Q_BACKENDS[q_backend](alpha, gamma, init_q_value, visits_threshold, R_plus)
 
-        self.q_function = td_qlearning(alpha, gamma, init_q_value, visits_threshold, R_plus)
+    # Agents pickled before feature sets were pluggable always used the basic features
+    def __setstate__(self, attributes):
+        self.__dict__.update(attributes)
+        if "features" not in attributes:
+            self.features = BasicFeatures()
 
-    def learn(self, num_games):
+    # With a metrics log, scores are only recorded in it, not printed
+    def learn(self, num_games, online=False, stats=None, metrics=None):
         for _ in range(num_games):
-            self.play_game()
+            self.play_game(render=False, online=online, stats=stats, metrics=metrics, verbose=metrics is None)
 
     # When playing through a game using our current policy, we store all state-action pairs. This generates a trial.
     # We then update the q-values AFTER the game, using this trial
     # *** BUT should we be updating q-values as we are generating a trial? ASK. Maybe doesn't matter
-    def play_game(self, learn=True, speed=1000):
+    # If online is True, q(s,a) is instead updated as soon as the next state is known, so no trial is kept and memory
+    # use does not grow with the length of the game
+    # If render is False the game is played headless (no pygame/display required) and speed is ignored. Otherwise
+    # only every render_every-th step is drawn, or with fps set, frames are drawn at that rate without slowing the
+    # game down (see GameRenderer)
+    # If log_trial is True the whole trial is printed at the end of the game
+    # seed and food_sequence are passed on to SnakeGame, to play a reproducible game
+    # If stats (an instrumentation.TrainingStats) is given, time spent in each phase of the game is recorded in it
+    # If metrics (a metrics.MetricsLog) is given, a record of the game is appended to it
+    # If verbose is True the score is printed at the end of the game
+    def play_game(self, learn=True, speed=1000, render=True, online=False, log_trial=False, seed=None,
+                  food_sequence=None, stats=None, render_every=1, fps=None, metrics=None, verbose=True):
+        game = SnakeGame(w=SCREEN_WIDTH, h=SCREEN_HEIGHT, speed=speed, seed=seed, food_sequence=food_sequence)
+        if render:
+            # Imported here so that headless games never require pygame
+            import pygame
+            from game_renderer import GameRenderer
+            pygame.init()
+            display = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            game.attach_observer(GameRenderer(display, speed=speed, render_every=render_every, fps=fps))
+        if stats is not None:
+            game.observers = [TimedObserver(observer, stats) for observer in game.observers]
+        trial = self.run_episode(game, learn=learn, online=online, keep_trial=log_trial, stats=stats, metrics=metrics)
+        if log_trial:
+            print(trial)
+
+        if verbose:
+            print("Score:", game.score)
+        if stats is not None:
+            stats.lap("log")
+        return game.score
+
+    # Plays the game passed in until it ends using the current policy, learning from it if learn is True (see
+    # play_game). Returns the trial if keep_trial is True, otherwise None
+    def run_episode(self, game, learn=True, online=False, keep_trial=False, stats=None, metrics=None):
+        if stats is not None:
+            stats.start_episode()
+        if metrics is not None:
+            metrics.start_episode(self.q_function)
+            # Steps whose action was chosen for its exploration value, counted before the q-function learns from them
+            explored_steps = 0
+        # The trial is needed for learning after the game, or if the caller wants it
+        learn_online = learn and online
+        learn_after_game = learn and not online
+        replay = learn and self.replay_buffer is not None
+        keep_trial = keep_trial or learn_after_game or replay
         trial = []
-        pygame.init()
-        display = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        game = SnakeGame(display, w=SCREEN_WIDTH, h=SCREEN_HEIGHT, speed=speed)
         prev_score = game.score
         turns_passed_since_last_ate = 0
+        prev_state = None
+        prev_action = None
         while not game.game_over:
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    quit()
-
             # Prevent infinite game loops
             if prev_score == game.score:
                 turns_passed_since_last_ate += 1
@@ -141,38 +493,146 @@ class SnakeAgent:
             if turns_passed_since_last_ate > 100:
                 break
 
-            state = game.get_state().bitstring()
-            action = self.q_function.policy(state)
-            trial.append((state, action))
+            state = self.features.state_code(game)
+            if stats is not None:
+                stats.lap("get_state")
+            if learn_online and prev_state is not None:
+                self.q_function.update_step(prev_state, prev_action, state)
+                if stats is not None:
+                    stats.lap("update")
+            if self.safe_policy is None:
+                action = self.q_function.policy(state)
+            else:
+                action = self.safe_policy.policy(self.q_function, state, game)
+            if metrics is not None and \
+                    self.q_function.num_visits_for_given_pair(state, action) < self.q_function.visits_threshold:
+                explored_steps += 1
+            if keep_trial:
+                trial.append((state, action))
+            prev_state = state
+            prev_action = action
+            if stats is not None:
+                stats.lap("policy")
             game.play_step(action)
+            if stats is not None:
+                stats.lap("step")
 
         # Add terminal state - has no action
-        trial.append((game.get_state().bitstring(), None))
-        print(trial)
+        if keep_trial:
+            trial.append((self.features.state_code(game), None))
 
-        if learn:
+        if learn_online and prev_state is not None:
+            self.q_function.update_step(prev_state, prev_action, None)
+        elif learn_after_game:
             self.q_function.update(trial)
-
-        print("Score:", game.score)
-        return game.score
+        if replay:
+            self._replay(trial)
+
+        if stats is not None:
+            stats.lap("update")
+            stats.end_episode(game, self.q_function)
+        if metrics is not None:
+            metrics.end_episode(game, self.q_function, explored_steps)
+        return trial if keep_trial else None
+
+    # Adds the transitions of trial to the replay buffer, then learns from a sample of the buffer
+    def _replay(self, trial):
+        states, actions, next_states, dones = trial_to_arrays(trial)
+        # Rewards only depend on the basic features, which are the low bits of every encoding (see features.py)
+        rewards = reward_table()[states & (NUM_STATES - 1), actions]
+        self.replay_buffer.add(states, actions, rewards, next_states, dones)
+
+        replays_left = int(self.replay_ratio*len(states))
+        while replays_left > 0:
+            batch_size = min(self.replay_batch_size, replays_left)
+            indices, (states, actions, rewards, next_states, dones) = self.replay_buffer.sample(batch_size)
+            # The transitions were counted as visits when they were played, so replaying them does not count again
+            self.q_function.update_batch(states, actions, next_states, dones, count_visits=False)
+            if self.replay_buffer.prioritized:
+                self.replay_buffer.update_priorities(indices, self.q_function.td_errors(states, actions, rewards,
+                                                                                        next_states, dones))
+            replays_left -= batch_size
 
     def save(self, filename="./agent_data/agent_data.pickle"):
         file = open(filename, "wb")
         pickle.dump(self, file)
         file.close()
 
+    # Agent saved by save, from whichever script saved it (see AgentUnpickler)
+    @staticmethod
+    def load(filename):
+        file = open(filename, "rb")
+        agent = AgentUnpickler(file).load()
+        file.close()
+        return agent
+
+    # The greedy policy of the agent as a lookup_policy.LookupPolicy - what the agent plays with learn=False and
+    # visits_threshold = 0, without the q-function. A safe policy is not part of it
+    def compile_policy(self):
+        return compile_policy(self.q_function, self.features.num_states, self.features)
+
+    # The q-function as (q_values, number_of_visits, hyperparameters), as stored in checkpoints (see checkpoint.py).
+    # A dict backed q-function is converted to dense arrays
+    def checkpoint_data(self):
+        q_function = self.q_function
+        if not isinstance(q_function, td_qlearning_array):
+            q_function = td_qlearning_array.from_q_function(q_function, self.features.num_states)
+        hyperparameters = {"alpha": q_function.alpha, "gamma": q_function.gamma,
+                           "init_q_value": q_function.init_q_value, "visits_threshold": q_function.visits_threshold,
+                           "R_plus": q_function.R_plus}
+        return q_function.q_values, q_function.number_of_visits, hyperparameters
+
+    # Saves the q-function in the compact checkpoint format (see checkpoint.py)
+    def save_checkpoint(self, path, games_played=0):
+        save_checkpoint(path, *self.checkpoint_data(), games_played=games_played)
+
+    # Agent (using the array backend) loaded from a checkpoint saved by save_checkpoint. By default the q-function
+    # is a read-only memory map of the checkpoint, which is enough to play with learn=False. Use mmap_mode=None to
+    # load a copy that can keep learning. features must be the feature set the checkpointed agent used (by default
+    # BasicFeatures)
+    @staticmethod
+    def from_checkpoint(path, mmap_mode="r", features=None):
+        return SnakeAgent.from_loaded_checkpoint(load_checkpoint(path, mmap_mode=mmap_mode), features)
+
+    # Agent using the arrays of a checkpoint.Checkpoint (e.g. from load_checkpoint or CheckpointLog.load) as they are
+    @staticmethod
+    def from_loaded_checkpoint(checkpoint, features=None):
+        agent = SnakeAgent.__new__(SnakeAgent)
+        agent.features = features if features is not None else BasicFeatures()
+        if len(checkpoint.q_values) != agent.features.num_states:
+            raise ValueError("Checkpoint has " + str(len(checkpoint.q_values)) + " states, but the feature set has " +
+                             str(agent.features.num_states))
+        agent.q_function = td_qlearning_array.from_arrays(checkpoint.q_values, checkpoint.number_of_visits,
+                                                          **checkpoint.hyperparameters())
+        return agent
+
 
 if __name__ == '__main__':
     # Greater than 0 if agent has been trained previously. If so, we start with the pretrained agent
     num_prev_games = 0
+    # Update q-values after every step (True) or after every game (False)
+    online_learning = False
+    # Set to True to watch training games as they are played. Frames are drawn at watch_fps without slowing training
+    watch_training = False
+    watch_fps = 30
+    # Set to True to record where training time goes (see instrumentation.py)
+    collect_stats = False
+    stats = TrainingStats(log_file="./agent_data/set_3/training_stats.jsonl") if collect_stats else None
+    # Set to True to append a record of every game to a metrics log instead of printing scores (see metrics.py).
+    # Plot it while training with: python metrics.py plot ./agent_data/set_3/training_metrics.jsonl --follow
+    log_metrics = True
+    metrics = MetricsLog("./agent_data/set_3/training_metrics.jsonl", first_episode=num_prev_games + 1) \
+        if log_metrics else None
     # Specify when to save agent in terms of total games played in its life
     save_checkpoints = list(range(50,2001,50))
     print("Save checkpoints:", save_checkpoints)
 
+    # Checkpoints are appended to a log that only stores what changed since the previous one (with a full
+    # snapshot every 10 checkpoints). Use checkpoint_log.export to extract one as a regular checkpoint
+    checkpoint_log = CheckpointLog("./agent_data/set_3/checkpoint_log", full_every=10)
+
     if num_prev_games > 0:
-        file = open("./agent_data/set_3/agent_" + str(num_prev_games) + "_games.pickle", "rb")
-        agent = pickle.load(file)
-        file.close()
+        agent = SnakeAgent.from_loaded_checkpoint(checkpoint_log.load(num_prev_games))
     else:
         agent = SnakeAgent()
 
@@ -183,16 +643,20 @@ if __name__ == '__main__':
     print("Num games to play: ", max(num_games_to_play_checkpoints))
 
     for game_num in range(1, max(num_games_to_play_checkpoints) + 1):
-        print("Current game:", game_num + num_prev_games)
+        if metrics is None:
+            print("Current game:", game_num + num_prev_games)
         # Save agent if at a checkpoint
         if game_num in num_games_to_play_checkpoints:
             original_threshold = agent.q_function.visits_threshold
             agent.q_function.visits_threshold = 0
-            agent.play_game(speed=20)
+            agent.play_game(speed=20, online=online_learning, stats=stats, metrics=metrics, verbose=metrics is None)
             agent.q_function.visits_threshold = original_threshold
-            agent.save(filename="./agent_data/set_3/agent_" + str(game_num + num_prev_games) + "_games.pickle")
+            checkpoint_log.append(*agent.checkpoint_data(), games_played=game_num + num_prev_games)
         else:
-            agent.play_game()
+            agent.play_game(render=watch_training, fps=watch_fps, online=online_learning, stats=stats,
+                            metrics=metrics, verbose=metrics is None)
+    if metrics is not None:
+        metrics.close()
 
     # Games are displayed slower once agent has had enough time to learn
     # while True:
@@ -0,0 +1,70 @@
+"""
+Checks for the checkpoint format. Run with: python -m pytest
+"""
+
+import numpy as np
+
+from checkpoint import convert_pickle, is_checkpoint, load_checkpoint
+from game import SnakeGame
+from replay_buffer import ReplayBuffer
+from snake_game_AI_agent import SnakeAgent
+from test_snake_game_AI_agent import save_as_main
+
+
+def _trained_agent(q_backend="array", num_games=30):
+    agent = SnakeAgent(q_backend=q_backend)
+    for seed in range(num_games):
+        agent.run_episode(SnakeGame(seed=seed))
+    return agent
+
+
+def test_save_and_load_round_trip(tmp_path):
+    agent = _trained_agent()
+    path = str(tmp_path / "checkpoint")
+    agent.save_checkpoint(path, games_played=30)
+    assert is_checkpoint(path)
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.header["games_played"] == 30
+    assert np.array_equal(checkpoint.q_values, agent.q_function.q_values)
+    assert np.array_equal(checkpoint.number_of_visits, agent.q_function.number_of_visits)
+    assert checkpoint.hyperparameters() == {"alpha": 0.1, "gamma": 0.9, "init_q_value": 0, "visits_threshold": 1,
+                                            "R_plus": 10000}
+
+    loaded = SnakeAgent.from_checkpoint(path)
+    assert [loaded.q_function.policy(state) for state in range(len(checkpoint.q_values))] == \
+        [agent.q_function.policy(state) for state in range(len(checkpoint.q_values))]
+
+
+# Agents resumed from a checkpoint train like new agents, including with a replay buffer
+def test_resume_training_with_replay_buffer(tmp_path):
+    path = str(tmp_path / "checkpoint")
+    _trained_agent().save_checkpoint(path)
+    agent = SnakeAgent.from_checkpoint(path, mmap_mode=None)
+    agent.replay_buffer = ReplayBuffer(1000, seed=0)
+    for seed in range(30, 40):
+        agent.run_episode(SnakeGame(seed=seed))
+    assert len(agent.replay_buffer) > 0
+
+
+# Dict backed agents are stored as dense arrays
+def test_dict_backend_round_trip(tmp_path):
+    agent = _trained_agent(q_backend="dict")
+    path = str(tmp_path / "checkpoint")
+    agent.save_checkpoint(path)
+    loaded = SnakeAgent.from_checkpoint(path)
+    for (state, action), value in agent.q_function.q_values.items():
+        assert abs(loaded.q_function.q_value(state, action) - value) < 1e-3
+        assert loaded.q_function.num_visits_for_given_pair(state, action) == \
+            agent.q_function.number_of_visits[(state, action)]
+
+
+# Legacy pickles saved by the training script refer to their classes through __main__
+def test_convert_pickle_saved_by_training_script(tmp_path, monkeypatch):
+    agent = _trained_agent(q_backend="dict")
+    pickle_path = tmp_path / "agent_30_games.pickle"
+    save_as_main(agent, pickle_path, monkeypatch)
+
+    checkpoint_path = convert_pickle(str(pickle_path))
+    assert checkpoint_path == str(tmp_path / "agent_30_games.ckpt")
+    assert load_checkpoint(checkpoint_path).header["games_played"] == 30
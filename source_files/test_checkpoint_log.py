@@ -0,0 +1,38 @@
+"""
+Checks for the delta checkpoint log. Run with: python -m pytest
+"""
+
+import numpy as np
+
+from checkpoint import load_checkpoint
+from checkpoint_log import CheckpointLog
+from game import SnakeGame
+from snake_game_AI_agent import SnakeAgent
+
+
+# Every checkpoint rebuilt from the log (full records, deltas, and after reopening the log) matches the arrays
+# that were appended
+def test_every_checkpoint_round_trips(tmp_path):
+    agent = SnakeAgent(q_backend="array")
+    log = CheckpointLog(str(tmp_path / "log"), full_every=3)
+    snapshots = dict()
+    for games_played in range(10, 80, 10):
+        for seed in range(games_played - 10, games_played):
+            agent.run_episode(SnakeGame(seed=seed))
+        if games_played == 40:
+            # Continue appending to the log after reopening it
+            log = CheckpointLog(str(tmp_path / "log"), full_every=3)
+        log.append(*agent.checkpoint_data(), games_played=games_played)
+        snapshots[games_played] = (agent.q_function.q_values.copy(), agent.q_function.number_of_visits.copy())
+
+    assert [record["kind"] for record in log.index] == ["full", "delta", "delta", "full", "delta", "delta", "full"]
+    reopened = CheckpointLog(str(tmp_path / "log"))
+    for games_played, (q_values, number_of_visits) in snapshots.items():
+        checkpoint = reopened.load(games_played)
+        assert np.array_equal(checkpoint.q_values, q_values)
+        assert np.array_equal(checkpoint.number_of_visits, number_of_visits)
+
+    reopened.export(50, str(tmp_path / "checkpoint_50"))
+    exported = load_checkpoint(str(tmp_path / "checkpoint_50"))
+    assert exported.header["games_played"] == 50
+    assert np.array_equal(exported.q_values, snapshots[50][0])
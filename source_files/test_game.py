@@ -0,0 +1,88 @@
+"""
+Checks for the game engines. Run with: python -m pytest
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from batch_game import BatchSnakeGame
+from game import SnakeGame, GridSnakeGame, BLOCK_SIZE, DANGER_BITS, FOOD_BITS
+from snake_game_AI_agent import td_qlearning
+
+
+# Moves mostly towards food while avoiding danger, but sometimes keeps going straight or turns at random, so games
+# end against walls as well as the snake's body
+def _action(state, direction, rng):
+    safe = [action for action in range(4) if not state & DANGER_BITS[action]]
+    towards_food = [action for action in safe if state & FOOD_BITS[action]]
+    if towards_food and rng.random() < 0.8:
+        return rng.choice(towards_food)
+    return direction if rng.random() < 0.5 else rng.randrange(4)
+
+
+# Direction of either engine as an action int
+def _direction(game):
+    return game.direction if isinstance(game.direction, int) else game.direction.value - 1
+
+
+# Both engines play the same game for the same seed and moves, with the same state codes at every step - including
+# the terminal state after hitting a wall
+def test_grid_game_matches_pixel_game():
+    death_causes = set()
+    for seed in range(300):
+        game = SnakeGame(seed=seed)
+        grid_game = GridSnakeGame(game.cols, game.rows, seed=seed)
+        rng = random.Random(seed)
+        while not game.game_over:
+            action = _action(game.get_state_code(), _direction(game), rng)
+            game.play_step(action)
+            grid_game.play_step(action)
+            assert grid_game.get_state_code() == game.get_state_code()
+            assert (grid_game.score, grid_game.steps, grid_game.game_over) == (game.score, game.steps, game.game_over)
+        assert grid_game.death_cause == game.death_cause
+        death_causes.add(game.death_cause)
+    assert death_causes == {"wall", "body"}
+
+
+def test_grid_game_obstacles_use_cells():
+    game = SnakeGame(seed=0)
+    grid_game = GridSnakeGame(game.cols, game.rows, seed=0)
+    for col in range(-1, game.cols + 1):
+        for row in range(-1, game.rows + 1):
+            assert grid_game._is_obstacle(col, row) == game._is_obstacle(col*BLOCK_SIZE, row*BLOCK_SIZE)
+    head = grid_game.head
+    assert grid_game._cell(head % grid_game.cols, head // grid_game.cols) == head
+
+
+# step returns the same state codes as play_step followed by get_state_code, with the reward td_qlearning.reward
+# gives the previous state and the action, and cannot be called once the game is over
+@pytest.mark.parametrize("game_class", [SnakeGame, GridSnakeGame])
+def test_step(game_class):
+    for seed in range(100):
+        game = game_class(seed=seed)
+        reference = game_class(seed=seed)
+        rng = random.Random(seed)
+        done = False
+        while not done:
+            state = game.get_state_code()
+            action = _action(state, _direction(game), rng)
+            state_code, reward, done = game.step(action)
+            reference.play_step(action)
+            assert state_code == reference.get_state_code()
+            assert reward == td_qlearning.reward(state, action)
+            assert done == reference.game_over
+        with pytest.raises(ValueError):
+            game.step(0)
+
+
+# Like SnakeAgent.run_episode, batch games that never find food end after hunger_limit moves. The snake circles a
+# 2x2 square next to its starting position (right, down, left, up)
+def test_batch_game_hunger_limit():
+    game = BatchSnakeGame(5, seed=0)
+    for move in range(1, 101):
+        _, _, dones, scores = game.step(np.full(game.num_games, [0, 3, 1, 2][(move - 1) % 4]))
+        assert (scores == 0).all()
+        assert dones.all() == (move == 100)
+        assert dones.any() == (move == 100)
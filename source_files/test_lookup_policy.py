@@ -0,0 +1,76 @@
+"""
+Checks for compiled lookup policies. Run with: python -m pytest
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from batch_game import BatchSnakeGame, state_codes
+from features import ExtendedFeatures
+from game import SnakeGame, NUM_STATES
+from lookup_policy import LookupPolicy, compile_policy
+from snake_game_AI_agent import SnakeAgent
+
+
+def _trained_agent(q_backend, features=None):
+    agent = SnakeAgent(q_backend=q_backend, features=features)
+    for seed in range(100):
+        agent.run_episode(SnakeGame(seed=seed))
+    agent.q_function.visits_threshold = 0
+    return agent
+
+
+# A compiled policy makes the same moves as the agent playing greedily
+@pytest.mark.parametrize("q_backend", ["dict", "array"])
+def test_policy_matches_agent(q_backend):
+    agent = _trained_agent(q_backend)
+    policy = agent.compile_policy()
+    assert len(policy) == NUM_STATES
+    assert [policy.policy(state) for state in range(NUM_STATES)] == \
+        [agent.q_function.policy(state) for state in range(NUM_STATES)]
+
+    for seed in range(1000, 1030):
+        game = SnakeGame(seed=seed)
+        compiled_game = SnakeGame(seed=seed)
+        agent.run_episode(game, learn=False)
+        policy.run_episode(compiled_game)
+        assert (compiled_game.score, compiled_game.steps, list(compiled_game.snake)) == \
+            (game.score, game.steps, list(game.snake))
+
+
+def test_extended_features_policy_matches_agent():
+    features = ExtendedFeatures(tail_direction=False, free_space=False)
+    agent = _trained_agent("array", features)
+    policy = agent.compile_policy()
+    for seed in range(1000, 1010):
+        game = SnakeGame(seed=seed)
+        compiled_game = SnakeGame(seed=seed)
+        agent.run_episode(game, learn=False)
+        policy.run_episode(compiled_game)
+        assert (compiled_game.score, compiled_game.steps) == (game.score, game.steps)
+
+
+# Saved policies pack 4 actions per byte and load back unchanged
+def test_save_and_load_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    policy = LookupPolicy(rng.integers(0, 4, NUM_STATES))
+    path = str(tmp_path / "policy.npy")
+    policy.save(path)
+    assert os.path.getsize(path) < NUM_STATES // 4 + 200
+    assert np.array_equal(LookupPolicy.load(path).actions, policy.actions)
+
+    with pytest.raises(ValueError):
+        LookupPolicy.load(path, ExtendedFeatures())
+
+
+def test_batch_policies():
+    policy = compile_policy(_trained_agent("array").q_function)
+    batch = BatchSnakeGame(64, seed=0)
+    features = batch.get_state()
+    for _ in range(100):
+        states = state_codes(features)
+        actions = policy.policies(states)
+        assert actions.tolist() == [policy.policy(state) for state in states.tolist()]
+        features, _, _, _ = batch.step(actions)
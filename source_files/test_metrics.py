@@ -0,0 +1,59 @@
+"""
+Checks for the streaming metrics log. Run with: python -m pytest
+"""
+
+import pytest
+
+from game import SnakeGame
+from metrics import MetricsLog, MetricsReader, RollingMetrics
+from snake_game_AI_agent import SnakeAgent
+
+
+@pytest.mark.parametrize("file_name", ["metrics.jsonl", "metrics.csv"])
+def test_reader_only_returns_new_records(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    agent = SnakeAgent()
+    log = MetricsLog(path, flush_every=10, flush_seconds=3600)
+    reader = MetricsReader(path)
+    assert reader.read_new() == []
+
+    for seed in range(25):
+        agent.run_episode(SnakeGame(seed=seed), metrics=log)
+    # Records are written in batches of flush_every
+    first = reader.read_new()
+    assert [record["episode"] for record in first] == list(range(1, 21))
+    assert reader.read_new() == []
+
+    log.close()
+    second = reader.read_new()
+    assert [record["episode"] for record in second] == list(range(21, 26))
+
+    records = first + second
+    assert sum(record["new_pairs"] for record in records) == records[-1]["visited_pairs"] == \
+        agent.q_function.num_visited_pairs()
+    for record in records:
+        assert isinstance(record["score"], int) and isinstance(record["exploration_rate"], float)
+        assert record["exploration_rate"] == record["explored_steps"]/record["steps"]
+
+
+# A line still being written is left for the next read
+def test_reader_skips_incomplete_line(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    path.write_text('{"episode": 1, "score": 2}\n{"episode": 2, "sc')
+    reader = MetricsReader(str(path))
+    assert reader.read_new() == [{"episode": 1, "score": 2}]
+    file = open(path, "a")
+    file.write('ore": 3}\n')
+    file.close()
+    assert reader.read_new() == [{"episode": 2, "score": 3}]
+
+
+def test_rolling_window():
+    rolling = RollingMetrics(window=3)
+    for episode, score in enumerate([1, 2, 3, 10], 1):
+        rolling.add({"episode": episode, "score": score, "steps": 10, "explored_steps": episode, "new_pairs": 1})
+    summary = rolling.summary()
+    assert summary["episodes"] == 4 and summary["window"] == 3
+    assert summary["mean_score"] == 5 and summary["max_score"] == 10
+    assert summary["exploration_rate"] == (2 + 3 + 4)/30
+    assert summary["new_pairs"] == 3
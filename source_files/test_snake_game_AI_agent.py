@@ -0,0 +1,109 @@
+"""
+Checks for the q-function backends and agent loading. Run with: python -m pytest
+"""
+
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+import evaluation
+import snake_game_AI_agent
+from game import SnakeGame
+from replay_buffer import ReplayBuffer
+from snake_game_AI_agent import SnakeAgent, td_qlearning_array, trial_to_arrays
+
+
+# Both backends learn the same q-function, so agents trained on the same games make the same moves
+def test_array_backend_matches_dict_backend():
+    for online in (False, True):
+        dict_agent = SnakeAgent(q_backend="dict")
+        array_agent = SnakeAgent(q_backend="array")
+        for seed in range(200):
+            dict_game = SnakeGame(seed=seed)
+            array_game = SnakeGame(seed=seed)
+            dict_agent.run_episode(dict_game, online=online)
+            array_agent.run_episode(array_game, online=online)
+            assert (dict_game.score, dict_game.steps) == (array_game.score, array_game.steps)
+
+        converted = td_qlearning_array.from_q_function(dict_agent.q_function)
+        assert np.array_equal(converted.number_of_visits, array_agent.q_function.number_of_visits)
+        # The array backend stores float32 q-values
+        assert np.allclose(converted.q_values, array_agent.q_function.q_values, atol=1e-3)
+
+
+# The per step rows of the array backend must match its arrays after every kind of update
+def test_array_backend_rows_match_arrays():
+    agent = SnakeAgent(q_backend="array")
+    for seed in range(50):
+        agent.run_episode(SnakeGame(seed=seed))
+    q_function = agent.q_function
+    trial = agent.run_episode(SnakeGame(seed=50), learn=False, keep_trial=True)
+    q_function.update_batch(*trial_to_arrays(trial), sequential=False)
+    for state in range(len(q_function.q_values)):
+        q_row, visits_row = q_function._row(state)
+        assert q_row == q_function.q_values[state].tolist()
+        assert visits_row == q_function.number_of_visits[state].tolist()
+
+
+# A row another thread stored after this one missed on the state (as the producer and the learner of
+# pipelined_trainer.py can) is used rather than replaced by a second copy
+def test_array_backend_keeps_row_stored_meanwhile():
+    class RowsStoredMeanwhile(dict):
+        def get(self, state, default=None):
+            self.setdefault(state, other_row)
+            return default
+
+    q_function = SnakeAgent(q_backend="array").q_function
+    other_row = q_function._row(0)
+    q_function._rows = RowsStoredMeanwhile()
+    assert q_function._row(0) is other_row
+
+
+# Saves agent the way the training script does - with its classes referred to as __main__.SnakeAgent, ...
+def save_as_main(agent, path, monkeypatch):
+    with monkeypatch.context() as patch:
+        for name in ("SnakeAgent", "td_qlearning", "td_qlearning_array", "BasicFeatures"):
+            cls = getattr(snake_game_AI_agent, name)
+            patch.setattr(cls, "__module__", "__main__")
+            patch.setattr(sys.modules["__main__"], name, cls, raising=False)
+        agent.save(str(path))
+
+
+@pytest.mark.parametrize("q_backend", ["dict", "array"])
+def test_load_agent_saved_by_training_script(tmp_path, monkeypatch, q_backend):
+    agent = SnakeAgent(q_backend=q_backend)
+    for seed in range(20):
+        agent.run_episode(SnakeGame(seed=seed))
+    path = tmp_path / "agent_20_games.pickle"
+    save_as_main(agent, path, monkeypatch)
+
+    # A plain unpickle looks for the classes in the __main__ module, which does not have them
+    file = open(path, "rb")
+    with pytest.raises(AttributeError):
+        pickle.load(file)
+    file.close()
+
+    loaded = SnakeAgent.load(str(path))
+    assert isinstance(loaded, SnakeAgent)
+    assert [loaded.q_function.policy(state) for state in range(1000)] == \
+        [agent.q_function.policy(state) for state in range(1000)]
+
+    # As loaded by evaluation workers
+    evaluation._loaded_agents.clear()
+    records = evaluation._play_games((str(path), [0, 1], 0))
+    assert [record["seed"] for record in records] == [0, 1]
+
+
+# Replayed transitions update q-values, but only transitions actually played count as visits
+@pytest.mark.parametrize("q_backend", ["dict", "array"])
+def test_replays_are_not_counted_as_visits(q_backend):
+    agent = SnakeAgent(q_backend=q_backend, replay_buffer=ReplayBuffer(1000, seed=0), replay_ratio=4.0)
+    played_transitions = 0
+    for seed in range(20):
+        trial = agent.run_episode(SnakeGame(seed=seed), keep_trial=True)
+        played_transitions += len(trial) - 1
+    visits = agent.q_function.number_of_visits
+    total_visits = sum(visits.values()) if q_backend == "dict" else int(visits.sum())
+    assert total_visits == played_transitions